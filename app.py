@@ -1,16 +1,47 @@
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from dataclasses import dataclass, field
 from functools import wraps
+from itertools import islice
+from types import SimpleNamespace
+from urllib.parse import quote
+import atexit
+import csv
+import glob
 import io
+import json
+import multiprocessing
 import os
-from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, flash, session, send_file, current_app
+import pickle
+import shutil
+import re
+import sqlite3
+import sys
+import threading
+import time as chrono
+import unicodedata
+import zipfile
+from flask import Flask, Request, Response, render_template, jsonify, request, redirect, url_for, flash, session, send_file, current_app, g, has_request_context, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, case, true, event
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, joinedload, undefer
+import click
 import hashlib
 import pandas as pd
 from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from itsdangerous import URLSafeSerializer, BadSignature
 from xhtml2pdf import pisa
-import tempfile
+from PIL import Image
 import base64
 
 app = Flask(__name__)
@@ -18,6 +49,41 @@ app.config['SECRET_KEY'] = 'secret!'
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=15)
+# Fichier SQLite optionnel partagé entre workers (versions des caches, entrées du tableau de bord)
+app.config['SHARED_CACHE_FILE'] = os.environ.get('SHARED_CACHE_FILE')
+# Cache du tableau de bord (durée de vie en secondes, nombre d'entrées)
+app.config['DASHBOARD_CACHE_TTL'] = int(os.environ.get('DASHBOARD_CACHE_TTL', 60))
+app.config['DASHBOARD_CACHE_SIZE'] = int(os.environ.get('DASHBOARD_CACHE_SIZE', 128))
+# Cache des comptes de résultat des périodes clôturées (invalidé par les écritures de ces périodes).
+# Sans SHARED_CACHE_FILE, l'invalidation ne touche que le worker qui écrit: durée de vie du tableau de bord
+app.config['RESULTATS_CACHE_TTL'] = int(os.environ.get(
+    'RESULTATS_CACHE_TTL', 86400 if app.config['SHARED_CACHE_FILE'] else app.config['DASHBOARD_CACHE_TTL']
+))
+app.config['RESULTATS_CACHE_SIZE'] = int(os.environ.get('RESULTATS_CACHE_SIZE', 32))
+# Délai maximal (secondes) avant qu'une révocation d'accès soit vue par un autre worker
+app.config['ACCESS_CACHE_INTERVAL'] = int(os.environ.get('ACCESS_CACHE_INTERVAL', 5))
+# Journal en écriture différée: les entrées sont insérées par lots hors de la transaction de la requête
+app.config['JOURNAL_WRITE_BEHIND'] = os.environ.get('JOURNAL_WRITE_BEHIND', '0') == '1'
+app.config['JOURNAL_BATCH_SIZE'] = int(os.environ.get('JOURNAL_BATCH_SIZE', 200))
+app.config['JOURNAL_FLUSH_MS'] = int(os.environ.get('JOURNAL_FLUSH_MS', 500))
+app.config['JOURNAL_SPILL_DIR'] = os.environ.get('JOURNAL_SPILL_DIR', 'journal_spill')
+app.config['JOURNAL_SYNC'] = os.environ.get('JOURNAL_SYNC', '0') == '1'  # vidage immédiat, sans thread (tests)
+# Nombre maximal de requêtes SQL pour l'affichage d'une page de liste (vérifié en mode test)
+app.config['LIST_QUERY_BUDGET'] = int(os.environ.get('LIST_QUERY_BUDGET', 6))
+# Cache disque des PDF de factures (dossier, taille maximale en octets)
+app.config['FACTURES_PDF_CACHE_DIR'] = os.environ.get('FACTURES_PDF_CACHE_DIR', 'cache/factures_pdf')
+app.config['FACTURES_PDF_CACHE_SIZE'] = int(os.environ.get('FACTURES_PDF_CACHE_SIZE', 256 * 1024 * 1024))
+# Nombre de processus de rendu des PDF de factures par lots (un groupe partagé par processus web ou worker)
+app.config['FACTURES_PDF_WORKERS'] = int(os.environ.get('FACTURES_PDF_WORKERS', min(os.cpu_count() or 1, 4)))
+# Tâches de fond (flask jobs-worker): dossier des résultats, conservation, scrutation, durée maximale
+app.config['JOBS_RESULTS_DIR'] = os.environ.get('JOBS_RESULTS_DIR', 'cache/taches')
+app.config['JOBS_RETENTION_HOURS'] = int(os.environ.get('JOBS_RETENTION_HOURS', 24))
+app.config['JOBS_POLL_INTERVAL'] = float(os.environ.get('JOBS_POLL_INTERVAL', 1.0))
+app.config['JOBS_TIMEOUT_MINUTES'] = int(os.environ.get('JOBS_TIMEOUT_MINUTES', 60))
+# Envoi des fichiers de rapports après contrôle d'accès: '' (par Flask), 'x-accel' (nginx, location
+# interne RAPPORTS_ACCEL_PREFIX servant le dossier uploads/rapports) ou 'x-sendfile' (Apache, lighttpd)
+app.config['RAPPORTS_DOWNLOAD_MODE'] = os.environ.get('RAPPORTS_DOWNLOAD_MODE', '')
+app.config['RAPPORTS_ACCEL_PREFIX'] = os.environ.get('RAPPORTS_ACCEL_PREFIX', '/_rapports/')
 
 db = SQLAlchemy(app)
 application = app
@@ -26,13 +92,23 @@ UPLOAD_FOLDER = 'uploads/rapports'
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Fichiers en cours de réception (formulaires et envois par morceaux), sur le même disque que UPLOAD_FOLDER
+DOSSIER_TELEVERSEMENTS = os.path.join(UPLOAD_FOLDER, 'televersements')
+# Durée de conservation d'un envoi par morceaux interrompu
+TELEVERSEMENT_EXPIRATION = timedelta(hours=24)
+# Envois par morceaux ouverts par utilisateur; au-delà, les plus anciens sont abandonnés
+MAX_TELEVERSEMENTS_PERSONNEL = 5
+# Stockage des fichiers de rapports par empreinte SHA-256 (voir chemin_objet_rapport)
+DOSSIER_OBJETS_RAPPORTS = os.path.join(UPLOAD_FOLDER, 'objets')
 
 # Créer le dossier d'uploads s'il n'existe pas
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(DOSSIER_TELEVERSEMENTS, exist_ok=True)
 
 # Modèles SQLAlchemy
 class Personnel(db.Model):
     __tablename__ = 'personnels'
+    __table_args__ = (db.Index('ix_personnels_date_depart', 'date_depart'),)
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nom = db.Column(db.String(20), nullable=False)
@@ -56,6 +132,10 @@ class Personnel(db.Model):
 
 class Trading(db.Model):
     __tablename__ = 'trading'
+    __table_args__ = (
+        db.Index('ix_trading_date_const', 'date_const'),
+        db.Index('ix_trading_personnel_date', 'personnel_id', 'date_const')
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date_const = db.Column(db.Date, nullable=True)
@@ -74,9 +154,14 @@ class Trading(db.Model):
     modalite_paiement = db.Column(db.String(255), nullable=True)
     type_paiement = db.Column(db.Enum('Virement bancaire', 'Cheque', 'Especes', 'Paiement mobile'), default='Especes')
     observations = db.Column(db.Text, nullable=True)
+    recherche = db.Column(db.Text, nullable=True)  # texte normalisé indexé (voir texte_recherche)
 
 class Academy(db.Model):
     __tablename__ = 'academy'
+    __table_args__ = (
+        db.Index('ix_academy_date_const', 'date_const'),
+        db.Index('ix_academy_personnel_date', 'personnel_id', 'date_const')
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date_const = db.Column(db.Date, nullable=True)
@@ -95,9 +180,14 @@ class Academy(db.Model):
     modalite_paiement = db.Column(db.String(255), nullable=True)
     type_paiement = db.Column(db.Enum('Virement bancaire', 'Cheque', 'Especes', 'Paiement mobile'), default='Especes')
     observations = db.Column(db.Text, nullable=True)
+    recherche = db.Column(db.Text, nullable=True)  # texte normalisé indexé (voir texte_recherche)
 
 class Digital(db.Model):
     __tablename__ = 'digital'
+    __table_args__ = (
+        db.Index('ix_digital_date_const', 'date_const'),
+        db.Index('ix_digital_personnel_date', 'personnel_id', 'date_const')
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date_const = db.Column(db.Date, nullable=True)
@@ -116,6 +206,7 @@ class Digital(db.Model):
     modalite_paiement = db.Column(db.String(255), nullable=True)
     type_paiement = db.Column(db.Enum('Virement bancaire', 'Cheque', 'Especes', 'Paiement mobile'), default='Especes')
     observations = db.Column(db.Text, nullable=True)
+    recherche = db.Column(db.Text, nullable=True)  # texte normalisé indexé (voir texte_recherche)
 
 class Materiel(db.Model):
     __tablename__ = 'materiels'
@@ -134,6 +225,7 @@ class Materiel(db.Model):
 
 class Finance(db.Model):
     __tablename__ = 'finances'
+    __table_args__ = (db.Index('ix_finances_compte_date_id', 'numero_compte', 'date', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.Date, nullable=True)
@@ -148,6 +240,7 @@ class Finance(db.Model):
 
 class Projet(db.Model):
     __tablename__ = 'projets'
+    __table_args__ = (db.Index('ix_projets_statut', 'statut'),)
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nom = db.Column(db.String(255), nullable=False)
@@ -160,6 +253,10 @@ class Projet(db.Model):
 
 class Evenementiel(db.Model):
     __tablename__ = 'evenementiels'
+    __table_args__ = (
+        db.Index('ix_evenementiels_date_debut', 'date_debut'),
+        db.Index('ix_evenementiels_statut_date', 'statut', 'date_debut')
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nom = db.Column(db.String(255), nullable=False)
@@ -172,6 +269,10 @@ class Evenementiel(db.Model):
 
 class Facture(db.Model):
     __tablename__ = 'factures'
+    __table_args__ = (
+        db.Index('ix_factures_date_id', 'date_facture', 'id'),
+        db.Index('ix_factures_personnel_id', 'personnel_id')
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     numero_facture = db.Column(db.String(50), unique=True, nullable=False)
@@ -186,7 +287,7 @@ class Facture(db.Model):
     tva = db.Column(db.Numeric(10, 2), nullable=True)
     montant_ttc = db.Column(db.Numeric(10, 2), nullable=True)
     modalite_paiement = db.Column(db.String(50), nullable=True)
-    date_facture = db.Column(db.DateTime, default=datetime.utcnow)
+    date_facture = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)    # clé de la pagination par curseur
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).date())
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).date(), onupdate=datetime.utcnow)
     observations = db.Column(db.Text, nullable=True)
@@ -194,6 +295,10 @@ class Facture(db.Model):
     personnel = db.relationship('Personnel', backref='factures', lazy=True)
 
 class UserActivity(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_activity_type_date', 'activity_type', 'created_at'),
+        db.Index('ix_user_activity_personnel_id', 'personnel_id')
+    )
     id = db.Column(db.Integer, primary_key=True)
     personnel_id = db.Column(db.Integer, db.ForeignKey('personnels.id', ondelete='CASCADE'), nullable=True)
     activity_type = db.Column(db.String(50), nullable=False)  # 'login', 'logout'
@@ -207,6 +312,10 @@ class UserActivity(db.Model):
         return f'<UserActivity {self.personnel.username} - {self.activity_type} at {self.created_at}>'
 
 class Journal(db.Model):
+    __table_args__ = (
+        db.Index('ix_journal_date', 'date'),
+        db.Index('ix_journal_personnel_id', 'personnel_id')
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).date())
     action = db.Column(db.String(255), nullable=False)
@@ -216,6 +325,10 @@ class Journal(db.Model):
 
 class Rapport(db.Model):
     __tablename__ = 'rapports'
+    __table_args__ = (
+        db.Index('ix_rapports_date_id', 'date_creation', 'id'),
+        db.Index('ix_rapports_personnel_date_id', 'personnel_id', 'date_creation', 'id')
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     titre = db.Column(db.String(255), nullable=False)
@@ -224,9 +337,10 @@ class Rapport(db.Model):
     chemin_fichier = db.Column(db.String(500), nullable=False)
     type_fichier = db.Column(db.String(10), nullable=False)  # 'pdf' ou 'docx'
     taille_fichier = db.Column(db.Integer, nullable=False)  # en bytes
+    empreinte_fichier = db.Column(db.String(64), nullable=True)  # SHA-256 du contenu
     semaine_debut = db.Column(db.Date, nullable=False)
     semaine_fin = db.Column(db.Date, nullable=False)
-    date_creation = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    date_creation = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))    # clé de la pagination par curseur
     date_modification = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=datetime.utcnow)
     personnel_id = db.Column(db.Integer, db.ForeignKey('personnels.id', ondelete='CASCADE'), nullable=False)
     statut = db.Column(db.Enum('brouillon', 'soumis', 'validé', 'rejeté'), default='brouillon', nullable=False)
@@ -235,8 +349,45 @@ class Rapport(db.Model):
     # Relations
     personnel = db.relationship('Personnel', backref='rapports_hebdo', lazy=True)
 
+class ObjetRapport(db.Model):
+    """Fichier de rapport stocké une seule fois par contenu, avec le nombre de rapports qui l'utilisent"""
+    __tablename__ = 'objets_rapports'
+
+    empreinte = db.Column(db.String(64), primary_key=True)    # SHA-256
+    taille = db.Column(db.Integer, nullable=False)
+    nb_references = db.Column(db.Integer, nullable=False, default=0)
+
+class FichierASupprimer(db.Model):
+    """Fichier de rapport supprimé en lot, effacé du disque par le worker (voir nettoyer_fichiers)"""
+    __tablename__ = 'fichiers_a_supprimer'
+    __table_args__ = (db.Index('ix_fichiers_a_supprimer_prochain_essai', 'prochain_essai'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    chemin = db.Column(db.String(500), nullable=False)
+    empreinte = db.Column(db.String(64), nullable=True)
+    tentatives = db.Column(db.Integer, nullable=False, default=0)
+    prochain_essai = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    erreur = db.Column(db.Text, nullable=True)
+
+class TeleversementRapport(db.Model):
+    """Fichier de rapport envoyé par morceaux, en attente du formulaire qui l'utilise"""
+    __tablename__ = 'televersements_rapports'
+    __table_args__ = (db.Index('ix_televersements_rapports_date_modification', 'date_modification'),)
+
+    id = db.Column(db.String(32), primary_key=True)
+    personnel_id = db.Column(db.Integer, db.ForeignKey('personnels.id', ondelete='CASCADE'), nullable=False)
+    nom_fichier = db.Column(db.String(255), nullable=False)
+    taille = db.Column(db.Integer, nullable=False)    # annoncée par le client
+    recu = db.Column(db.Integer, nullable=False, default=0)    # octets écrits sans interruption depuis le début
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow)
+
 class ProcesVerbal(db.Model):
     __tablename__ = 'proces_verbaux'
+    __table_args__ = (
+        db.Index('ix_proces_verbaux_date_id', 'date_reunion', 'id'),
+        db.Index('ix_proces_verbaux_statut_date_id', 'statut', 'date_reunion', 'id')
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     titre = db.Column(db.String(255), nullable=False)
@@ -260,6 +411,7 @@ class ProcesVerbal(db.Model):
 
 class PVParticipant(db.Model):
     __tablename__ = 'pv_participants'
+    __table_args__ = (db.Index('ix_pv_participants_pv', 'proces_verbal_id'),)
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     proces_verbal_id = db.Column(db.Integer, db.ForeignKey('proces_verbaux.id', ondelete='CASCADE'), nullable=False)
@@ -270,6 +422,85 @@ class PVParticipant(db.Model):
     # Relations
     personnel = db.relationship('Personnel', backref='participations_pv', lazy=True)
 
+# Nombre de participants calculé en SQL (chargé à la demande, voir PROFILS_CHARGEMENT)
+ProcesVerbal.nb_participants = db.column_property(
+    db.select(func.count(PVParticipant.id)).where(
+        PVParticipant.proces_verbal_id == ProcesVerbal.id
+    ).correlate_except(PVParticipant).scalar_subquery(),
+    deferred=True
+)
+
+class RevenuJournalier(db.Model):
+    """Cumul des revenus TTC par département et par jour (maintenu par les routes)"""
+    __tablename__ = 'revenus_journaliers'
+    __table_args__ = (db.UniqueConstraint('departement', 'date', name='uq_revenus_journaliers_dept_date'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    departement = db.Column(db.Enum('Trading', 'Academy', 'Digital'), nullable=False)
+    date = db.Column(db.Date, nullable=True)  # date_const de l'opération (peut être vide)
+    montant_ttc = db.Column(db.Float, nullable=False, default=0)
+    nb_operations = db.Column(db.Integer, nullable=False, default=0)
+
+class SoldeMensuel(db.Model):
+    """Solde de clôture d'un compte: écritures (crédit - débit) datées avant date_arrete, ou sans date"""
+    __tablename__ = 'soldes_mensuels'
+    __table_args__ = (db.UniqueConstraint('numero_compte', 'date_arrete', name='uq_soldes_mensuels_compte_date'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    numero_compte = db.Column(db.String(255), nullable=False)    # '' pour les écritures sans compte
+    date_arrete = db.Column(db.Date, nullable=False)    # premier jour du mois suivant le mois clôturé
+    solde = db.Column(db.Float, nullable=False, default=0)
+
+class CompteurFacture(db.Model):
+    """Dernier numéro de facture attribué pour une journée (voir allouer_numero_facture)"""
+    __tablename__ = 'compteurs_factures'
+
+    periode = db.Column(db.String(8), primary_key=True, autoincrement=False)    # AAAAMMJJ
+    dernier_numero = db.Column(db.Integer, nullable=False, default=0)
+
+class Tache(db.Model):
+    """Travail long (PDF, export) exécuté hors requête par `flask jobs-worker` (voir TACHES)"""
+    __tablename__ = 'taches'
+    __table_args__ = (db.Index('ix_taches_statut_id', 'statut', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    type = db.Column(db.String(50), nullable=False)
+    parametres = db.Column(db.Text, nullable=False, default='{}')    # JSON
+    statut = db.Column(db.Enum('en attente', 'en cours', 'terminée', 'échec'), default='en attente', nullable=False)
+    personnel_id = db.Column(db.Integer, db.ForeignKey('personnels.id', ondelete='CASCADE'), nullable=True)
+    tentatives = db.Column(db.Integer, nullable=False, default=0)
+    processus = db.Column(db.String(100), nullable=True)    # worker qui exécute la tâche
+    date_battement = db.Column(db.DateTime, nullable=True)  # dernier signe de vie de ce worker
+    nom_fichier = db.Column(db.String(255), nullable=True)
+    type_mime = db.Column(db.String(100), nullable=True)
+    taille = db.Column(db.Integer, nullable=True)
+    erreur = db.Column(db.Text, nullable=True)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_debut = db.Column(db.DateTime, nullable=True)
+    date_fin = db.Column(db.DateTime, nullable=True)
+
+class MigrationSchema(db.Model):
+    """Migrations de schéma déjà appliquées à la base (voir appliquer_migrations)"""
+    __tablename__ = 'schema_migrations'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255), nullable=False)
+    date_application = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+# Tables de ventes alimentant le cumul des revenus
+MODELES_REVENUS = {'Trading': Trading, 'Academy': Academy, 'Digital': Digital}
+
+# Profils de chargement des pages de liste: relations lues par le template pour chaque ligne,
+# chargées avec la page au lieu d'une requête par ligne
+PROFILS_CHARGEMENT = {
+    'journal_list': (joinedload(Journal.personnel),),
+    'rapport_list': (joinedload(Rapport.personnel),),
+    # Vue administrateur: le personnel est déjà joint pour la recherche sur son nom
+    'rapport_list_admin': (contains_eager(Rapport.personnel),),
+    # La liste des PV joint toujours le créateur (recherche sur son nom)
+    'proces_verbal_list': (contains_eager(ProcesVerbal.createur), undefer(ProcesVerbal.nb_participants)),
+}
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -278,8 +509,8 @@ def login_required(f):
             return redirect(url_for('login'))
         
         # Vérification supplémentaire: s'assurer que l'utilisateur n'a pas de date de départ
-        personnel = Personnel.query.get(session['id'])
-        if personnel and personnel.date_depart is not None:
+        # (cache des révocations par processus, sans requête en base sur le chemin courant)
+        if cache_revocations.est_revoque(session['id']):
             session.clear()
             flash('Votre accès a été révoqué. Veuillez contacter l\'administrateur.', 'error')
             return redirect(url_for('login'))
@@ -317,6 +548,10 @@ def init_db():
     """Initialise la base de données et crée l'utilisateur admin par défaut"""
     with app.app_context():
         db.create_all()
+
+        # Mise à niveau du schéma d'une base existante (index, colonnes ajoutées),
+        # avant toute requête ORM sur les modèles dont les colonnes sont migrées
+        appliquer_migrations()
         
         # Créer l'utilisateur admin par défaut s'il n'existe pas
         existing_admin = Personnel.query.filter_by(username='admin', role='Administrator').first()
@@ -339,84 +574,1343 @@ def init_db():
             db.session.add(admin)
             db.session.commit()
 
+        # Initialiser le cumul des revenus pour une base existante
+        # (requête sur le seul id: les colonnes ajoutées par migration n'existent peut-être pas encore)
+        if db.session.query(RevenuJournalier.id).limit(1).scalar() is None and any(
+            db.session.query(modele.id).limit(1).scalar() is not None for modele in MODELES_REVENUS.values()
+        ):
+            rebuild_revenus_journaliers()
+
 # Fonction utilitaire pour enregistrer dans le journal
 def log_activity(action, description, personnel_id=None):
     """Enregistre une activité dans la table Journal"""
     if personnel_id is None:
         personnel_id = session.get('id')
     
-    journal = Journal(
-        action=action,
-        description=description,
-        personnel_id=personnel_id
+    if ecrivain_journal is not None:
+        # Écriture différée: l'entrée n'est transmise à l'écrivain qu'après le commit
+        db.session.info.setdefault('journal_en_attente', []).append({
+            'date': datetime.now(timezone.utc).date().isoformat(),
+            'action': action,
+            'description': description,
+            'personnel_id': personnel_id
+        })
+    else:
+        journal = Journal(
+            action=action,
+            description=description,
+            personnel_id=personnel_id
+        )
+        db.session.add(journal)
+    marquer_donnees_modifiees()
+
+class EcrivainJournal:
+    """Écriture différée et groupée des entrées du Journal.
+
+    Les entrées validées sont ajoutées à une file en mémoire et à un fichier de
+    débordement (une ligne JSON par entrée, synchronisé sur disque). Un thread
+    les insère par lots (INSERT multi-lignes) toutes les `taille_lot` entrées
+    ou toutes les `delai_ms` millisecondes. Au démarrage, les fichiers laissés
+    par un processus arrêté brutalement sont rejoués (livraison au moins une fois).
+    En mode synchrone, chaque ajout est inséré immédiatement, sans thread.
+    """
+
+    DELAI_MAX_ESSAI = 60  # secondes entre deux essais quand la base ne répond pas
+
+    def __init__(self, dossier, taille_lot=200, delai_ms=500, synchrone=False):
+        self.dossier = dossier
+        self.taille_lot = taille_lot
+        self.delai = delai_ms / 1000
+        self.synchrone = synchrone
+        self._file = []
+        self._condition = threading.Condition()
+        self._pid = None
+
+    @property
+    def _fichier(self):
+        return os.path.join(self.dossier, f'journal-{os.getpid()}.jsonl')
+
+    def _demarrer_si_necessaire(self):
+        # Démarrage paresseux: les threads ne survivent pas au fork des workers
+        if self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._file = []
+            os.makedirs(self.dossier, exist_ok=True)
+            self._reprendre_fichiers_orphelins()
+            if not self.synchrone:
+                threading.Thread(target=self._boucle, name='ecrivain-journal', daemon=True).start()
+                atexit.register(self.vider)
+
+    def _reprendre_fichiers_orphelins(self):
+        """Rejoue les entrées laissées par des processus qui ne tournent plus"""
+        for chemin in glob.glob(os.path.join(self.dossier, 'journal-*.jsonl*')):
+            try:
+                pid = int(os.path.basename(chemin).split('-')[1].split('.')[0])
+                if pid != os.getpid():
+                    os.kill(pid, 0)
+                    continue  # processus toujours actif
+            except ProcessLookupError:
+                pass
+            except (ValueError, PermissionError):
+                continue
+            repris = f'{self._fichier}.repris'
+            try:
+                os.rename(chemin, repris)  # un seul processus peut réclamer le fichier
+            except OSError:
+                continue
+            with open(repris, encoding='utf-8') as f:
+                entrees = [json.loads(ligne) for ligne in f if ligne.strip()]
+            self._ecrire_fichier(entrees)
+            self._file.extend(entrees)
+            os.remove(repris)
+
+    def _ecrire_fichier(self, entrees):
+        with open(self._fichier, 'a', encoding='utf-8') as f:
+            for entree in entrees:
+                f.write(json.dumps(entree) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def ajouter(self, entrees):
+        """Ajoute des entrées validées à la file d'écriture.
+
+        Appelé après le commit: une erreur (fichier de débordement, insertion en mode
+        synchrone) est journalisée sans être levée, les entrées restant dans la file.
+        """
+        try:
+            self._demarrer_si_necessaire()
+            with self._condition:
+                self._file.extend(entrees)
+                plein = len(self._file) >= self.taille_lot
+                if plein and not self.synchrone:
+                    self._condition.notify()
+                self._ecrire_fichier(entrees)
+            if self.synchrone:
+                self.vider()
+        except Exception:
+            app.logger.exception("Erreur lors de l'écriture du journal, nouvel essai au prochain vidage")
+
+    def _boucle(self):
+        echecs = 0
+        while True:
+            if echecs:
+                # Base indisponible: la file reste pleine, on espace les nouveaux essais
+                chrono.sleep(min(self.delai * 2 ** echecs, self.DELAI_MAX_ESSAI))
+            else:
+                with self._condition:
+                    self._condition.wait_for(lambda: len(self._file) >= self.taille_lot, timeout=self.delai)
+            try:
+                self.vider()
+                echecs = 0
+            except Exception:
+                echecs = min(echecs + 1, 16)
+                app.logger.exception("Erreur lors de l'écriture du journal (essai %d)", echecs)
+
+    def vider(self):
+        """Insère toutes les entrées en attente, en un seul lot"""
+        if self._pid != os.getpid():
+            return
+        with self._condition:
+            if not self._file:
+                return
+            entrees, self._file = self._file, []
+            # Nom propre à chaque vidage: deux vidages simultanés (requêtes en mode
+            # synchrone, atexit et thread) ne doivent pas écraser le fichier de l'autre
+            en_cours = f'{self._fichier}.{os.urandom(8).hex()}.en-cours'
+            try:
+                os.replace(self._fichier, en_cours)
+            except FileNotFoundError:
+                en_cours = None    # écriture du fichier de débordement en échec: entrées en mémoire seulement
+
+        try:
+            with app.app_context():
+                self._inserer(entrees)
+                cache_dashboard.invalider()
+        except Exception:
+            # Les entrées restent dans la file et sur disque pour un nouvel essai
+            with self._condition:
+                self._file[:0] = entrees
+                self._ecrire_fichier(entrees)
+            if en_cours:
+                os.remove(en_cours)
+            raise
+        if en_cours:
+            os.remove(en_cours)
+
+    def _inserer(self, entrees):
+        lignes = [dict(entree, date=datetime.fromisoformat(entree['date'])) for entree in entrees]
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(db.insert(Journal), lignes)
+        except IntegrityError:
+            # Un personnel a pu être supprimé entre-temps: on insère ligne par ligne
+            for ligne in lignes:
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(db.insert(Journal), [ligne])
+                except IntegrityError:
+                    with db.engine.begin() as conn:
+                        conn.execute(db.insert(Journal), [dict(ligne, personnel_id=None)])
+
+ecrivain_journal = EcrivainJournal(
+    app.config['JOURNAL_SPILL_DIR'],
+    taille_lot=app.config['JOURNAL_BATCH_SIZE'],
+    delai_ms=app.config['JOURNAL_FLUSH_MS'],
+    synchrone=app.config['JOURNAL_SYNC']
+) if app.config['JOURNAL_WRITE_BEHIND'] or app.config['JOURNAL_SYNC'] else None
+
+def connexion_partagee(fichier):
+    """Ouvre une connexion au fichier SQLite partagé entre workers (mode autocommit)"""
+    return closing(sqlite3.connect(fichier, timeout=5, isolation_level=None))
+
+class CompteurVersion:
+    """Compteur global de version, propre au processus ou stocké dans un fichier SQLite partagé"""
+
+    def __init__(self, nom, fichier_partage=None):
+        self.nom = nom
+        self.fichier_partage = fichier_partage
+        self._valeur = 0
+        self._verrou = threading.Lock()
+        if fichier_partage:
+            with connexion_partagee(fichier_partage) as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS versions (nom TEXT PRIMARY KEY, valeur INTEGER NOT NULL)')
+                conn.execute('INSERT OR IGNORE INTO versions (nom, valeur) VALUES (?, 0)', (nom,))
+
+    def valeur(self):
+        if not self.fichier_partage:
+            return self._valeur
+        with connexion_partagee(self.fichier_partage) as conn:
+            return conn.execute('SELECT valeur FROM versions WHERE nom = ?', (self.nom,)).fetchone()[0]
+
+    def incrementer(self):
+        if self.fichier_partage:
+            with connexion_partagee(self.fichier_partage) as conn:
+                conn.execute('UPDATE versions SET valeur = valeur + 1 WHERE nom = ?', (self.nom,))
+        else:
+            with self._verrou:
+                self._valeur += 1
+
+class CacheVersionne:
+    """Cache invalidé par un numéro de version global (tableau de bord, comptes de résultat).
+
+    Chaque processus garde un cache mémoire borné (durée de vie + éviction LRU).
+    Sans fichier partagé, la version est propre au processus et les autres
+    workers se resynchronisent à l'expiration des entrées. Avec un fichier
+    SQLite partagé, la version et les entrées y sont stockées et tous les
+    workers voient les mêmes invalidations.
+    """
+
+    _ABSENT = object()
+
+    def __init__(self, ttl=60, taille_max=128, fichier_partage=None, nom='dashboard'):
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self.fichier_partage = fichier_partage
+        self.compteur = CompteurVersion(nom, fichier_partage)
+        self._table = 'entrees' if nom == 'dashboard' else f'entrees_{nom}'    # une table par cache partagé
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        if fichier_partage:
+            with self._connexion() as conn:
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {self._table} (cle TEXT PRIMARY KEY, valeur BLOB NOT NULL, expiration REAL NOT NULL)')
+
+    def _connexion(self):
+        return connexion_partagee(self.fichier_partage)
+
+    def version(self):
+        return self.compteur.valeur()
+
+    def invalider(self):
+        """Incrémente la version: toutes les entrées existantes deviennent obsolètes"""
+        self.compteur.incrementer()
+        if self.fichier_partage:
+            with self._connexion() as conn:
+                conn.execute(f'DELETE FROM {self._table}')
+        with self._verrou:
+            self._entrees.clear()
+
+    def obtenir(self, cle, calcul):
+        """Retourne la valeur en cache pour la version courante, ou la calcule"""
+        cle = repr((self.version(), cle))
+        maintenant = chrono.time()
+
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None and entree[0] > maintenant:
+                self._entrees.move_to_end(cle)
+                return entree[1]
+
+        expiration, valeur = maintenant + self.ttl, self._ABSENT
+        if self.fichier_partage:
+            with self._connexion() as conn:
+                ligne = conn.execute(
+                    f'SELECT valeur, expiration FROM {self._table} WHERE cle = ? AND expiration > ?', (cle, maintenant)
+                ).fetchone()
+            if ligne:
+                valeur, expiration = pickle.loads(ligne[0]), ligne[1]
+
+        if valeur is self._ABSENT:
+            valeur = calcul()
+            if self.fichier_partage:
+                with self._connexion() as conn:
+                    conn.execute(f'INSERT OR REPLACE INTO {self._table} (cle, valeur, expiration) VALUES (?, ?, ?)',
+                                 (cle, pickle.dumps(valeur), expiration))
+                    conn.execute(f'DELETE FROM {self._table} WHERE expiration <= ?', (maintenant,))
+                    conn.execute(f'DELETE FROM {self._table} WHERE cle NOT IN '
+                                 f'(SELECT cle FROM {self._table} ORDER BY expiration DESC LIMIT ?)', (self.taille_max,))
+
+        with self._verrou:
+            self._entrees[cle] = (expiration, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+        return valeur
+
+cache_dashboard = CacheVersionne(
+    ttl=app.config['DASHBOARD_CACHE_TTL'],
+    taille_max=app.config['DASHBOARD_CACHE_SIZE'],
+    fichier_partage=app.config['SHARED_CACHE_FILE']
+)
+
+cache_resultats = CacheVersionne(
+    ttl=app.config['RESULTATS_CACHE_TTL'],
+    taille_max=app.config['RESULTATS_CACHE_SIZE'],
+    fichier_partage=app.config['SHARED_CACHE_FILE'],
+    nom='resultats'
+)
+
+class CacheRevocations:
+    """Cache par processus des dates de départ du personnel, utilisé par login_required.
+
+    La table {id: date_depart} est rechargée en une seule requête lorsque le
+    compteur global de révocations change (modification ou suppression d'un
+    personnel) ou au plus tard toutes les `intervalle` secondes. Le chemin
+    courant d'une requête authentifiée ne touche donc pas la base.
+    """
+
+    def __init__(self, intervalle=5, fichier_partage=None):
+        self.intervalle = intervalle
+        self.compteur = CompteurVersion('revocations', fichier_partage)
+        self._departs = {}
+        self._version = None
+        self._prochain_rechargement = 0
+        self._verrou = threading.Lock()
+
+    def _recharger_si_necessaire(self):
+        maintenant = chrono.monotonic()
+        version = self.compteur.valeur()
+        if version == self._version and maintenant < self._prochain_rechargement:
+            return
+        with self._verrou:
+            if version == self._version and maintenant < self._prochain_rechargement:
+                return
+            self._departs = dict(
+                db.session.query(Personnel.id, Personnel.date_depart).filter(
+                    Personnel.date_depart.isnot(None)
+                ).all()
+            )
+            self._version = version
+            self._prochain_rechargement = maintenant + self.intervalle
+
+    def est_revoque(self, personnel_id):
+        self._recharger_si_necessaire()
+        return personnel_id in self._departs
+
+    def invalider(self):
+        self.compteur.incrementer()
+
+cache_revocations = CacheRevocations(
+    intervalle=app.config['ACCESS_CACHE_INTERVAL'],
+    fichier_partage=app.config['SHARED_CACHE_FILE']
+)
+
+def marquer_donnees_modifiees():
+    """Signale que la transaction en cours modifie des données du tableau de bord"""
+    db.session.info['donnees_modifiees'] = True
+
+def marquer_resultats_modifies(*jours):
+    """Signale une écriture datée d'un mois clôturé: les comptes de résultat en cache sont périmés"""
+    debut_mois = datetime.now().date().replace(day=1)
+    if any(jour is not None and jour < debut_mois for jour in jours):
+        db.session.info['resultats_modifies'] = True
+
+def marquer_acces_modifies():
+    """Signale que la transaction en cours peut révoquer ou rétablir l'accès d'un personnel"""
+    db.session.info['acces_modifies'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def invalider_cache_apres_commit(session):
+    # L'invalidation n'a lieu qu'une fois les données visibles par les autres requêtes
+    if session.info.pop('donnees_modifiees', False):
+        cache_dashboard.invalider()
+    if session.info.pop('acces_modifies', False):
+        cache_revocations.invalider()
+    if session.info.pop('resultats_modifies', False):
+        cache_resultats.invalider()
+    entrees_journal = session.info.pop('journal_en_attente', None)
+    if entrees_journal:
+        ecrivain_journal.ajouter(entrees_journal)
+
+@event.listens_for(db.session, 'after_rollback')
+def oublier_modifications_apres_rollback(session):
+    session.info.pop('donnees_modifiees', None)
+    session.info.pop('acces_modifies', None)
+    session.info.pop('resultats_modifies', None)
+    session.info.pop('journal_en_attente', None)
+
+def maj_revenu_journalier(departement, jour, montant, nb_operations=1):
+    """Applique un delta au cumul des revenus d'un département pour un jour donné"""
+    montant = montant or 0
+    if not montant and not nb_operations:
+        return
+    marquer_resultats_modifies(jour)
+
+    table = RevenuJournalier.__table__
+    deltas = {
+        'montant_ttc': table.c.montant_ttc + montant,
+        'nb_operations': table.c.nb_operations + nb_operations
+    }
+    dialecte = db.engine.dialect.name
+    if jour is not None and (dialecte == 'postgresql' or (dialecte == 'sqlite' and sqlite3.sqlite_version_info >= (3, 24))):
+        # Une seule instruction: INSERT ... ON CONFLICT DO UPDATE sur (departement, date)
+        insert = insert_postgresql if dialecte == 'postgresql' else insert_sqlite
+        db.session.execute(insert(table).values(
+            departement=departement, date=jour, montant_ttc=montant, nb_operations=nb_operations
+        ).on_conflict_do_update(index_elements=[table.c.departement, table.c.date], set_=deltas))
+        return
+
+    filtre_date = table.c.date.is_(None) if jour is None else table.c.date == jour
+    maj = table.update().where(table.c.departement == departement, filtre_date).values(**deltas)
+    if db.session.execute(maj).rowcount == 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(
+                    departement=departement, date=jour, montant_ttc=montant, nb_operations=nb_operations
+                ))
+        except IntegrityError:
+            # Ligne du jour créée entre-temps par une autre transaction
+            db.session.execute(maj)
+
+def deplacer_revenu_journalier(departement, ancien_jour, ancien_montant, jour, montant):
+    """Répercute la modification d'une opération sur le cumul des revenus"""
+    marquer_resultats_modifies(ancien_jour, jour)    # HT ou TVA ont pu changer sans le TTC
+    if ancien_jour == jour and (ancien_montant or 0) == (montant or 0):
+        return
+    maj_revenu_journalier(departement, ancien_jour, -(ancien_montant or 0), -1)
+    maj_revenu_journalier(departement, jour, montant, 1)
+
+def retirer_revenus_personnel(personnel_id):
+    """Retire du cumul les opérations supprimées en cascade avec un personnel"""
+    for departement, modele in MODELES_REVENUS.items():
+        lignes = db.session.query(
+            modele.date_const,
+            func.sum(modele.montant_ttc),
+            func.count(modele.id)
+        ).filter(modele.personnel_id == personnel_id).group_by(modele.date_const).all()
+        for jour, montant, nb in lignes:
+            maj_revenu_journalier(departement, jour, -(montant or 0), -nb)
+
+def rebuild_revenus_journaliers():
+    """Recalcule entièrement le cumul des revenus à partir des tables de ventes"""
+    RevenuJournalier.query.delete()
+    nb_lignes = 0
+    for departement, modele in MODELES_REVENUS.items():
+        lignes = db.session.query(
+            modele.date_const,
+            func.sum(modele.montant_ttc),
+            func.count(modele.id)
+        ).group_by(modele.date_const).all()
+        db.session.add_all([
+            RevenuJournalier(departement=departement, date=jour, montant_ttc=montant or 0, nb_operations=nb)
+            for jour, montant, nb in lignes
+        ])
+        nb_lignes += len(lignes)
+    db.session.commit()
+    return nb_lignes
+
+# Colonnes couvertes par la recherche des listes de ventes
+CHAMPS_RECHERCHE = ('nom_client', 'prenom_client', 'email_client', 'phone_client', 'type_libelle', 'items')
+# Taille minimale d'un terme cherché par trigrammes
+TAILLE_MIN_TRIGRAMME = 3
+
+def normaliser_recherche(texte):
+    """Minuscules, sans accents, espaces réduits"""
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return ' '.join(texte.lower().split())
+
+def texte_recherche(operation):
+    """Texte normalisé stocké dans la colonne `recherche` d'une opération"""
+    valeurs = [getattr(operation, champ) for champ in CHAMPS_RECHERCHE]
+    if operation.phone_client:
+        valeurs.append(re.sub(r'\D', '', operation.phone_client))  # numéro sans séparateurs
+    return normaliser_recherche(' '.join(v for v in valeurs if v))
+
+def maj_colonne_recherche(mapper, connection, operation):
+    operation.recherche = texte_recherche(operation)
+
+for _modele in MODELES_REVENUS.values():
+    event.listen(_modele, 'before_insert', maj_colonne_recherche)
+    event.listen(_modele, 'before_update', maj_colonne_recherche)
+
+_tables_plein_texte = {}
+
+def table_plein_texte(modele):
+    """Table FTS5 de recherche d'un modèle (SQLite), ou None si elle n'existe pas"""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    nom = f'{modele.__tablename__}_fts'
+    if nom not in _tables_plein_texte:
+        existe = db.inspect(db.engine).has_table(nom)
+        _tables_plein_texte[nom] = db.table(nom, db.column('rowid'), db.column('rank')) if existe else None
+    return _tables_plein_texte[nom]
+
+def indexer_recherche(modele, tout=False, taille_lot=2000):
+    """Renseigne la colonne `recherche` par lots (lignes non indexées, ou toutes)"""
+    table = modele.__table__
+    colonnes = [table.c.id] + [table.c[champ] for champ in CHAMPS_RECHERCHE]
+    maj = table.update().where(table.c.id == db.bindparam('b_id')).values(recherche=db.bindparam('b_recherche'))
+    nb_lignes, dernier_id = 0, 0
+    with db.engine.begin() as conn:
+        while True:
+            requete = db.select(*colonnes).where(table.c.id > dernier_id).order_by(table.c.id).limit(taille_lot)
+            if not tout:
+                requete = requete.where(table.c.recherche.is_(None))
+            lignes = conn.execute(requete).all()
+            if not lignes:
+                break
+            conn.execute(maj, [{'b_id': ligne.id, 'b_recherche': texte_recherche(ligne)} for ligne in lignes])
+            nb_lignes += len(lignes)
+            dernier_id = lignes[-1].id
+    return nb_lignes
+
+def installer_index_recherche(reconstruire=False):
+    """Crée la colonne `recherche` et son index sur les tables de ventes s'ils manquent.
+
+    PostgreSQL: index GIN trigrammes (pg_trgm), utilisé par LIKE '%terme%'.
+    SQLite (3.34+): table FTS5 à contenu externe (tokenizer trigram) tenue à jour
+    par des triggers. Ailleurs, la recherche se fait par LIKE sur la seule colonne.
+    Retourne le nombre de lignes indexées.
+    """
+    dialecte = db.engine.dialect.name
+    nb_lignes = 0
+    for modele in MODELES_REVENUS.values():
+        table = modele.__tablename__
+        colonnes = {c['name'] for c in db.inspect(db.engine).get_columns(table)}
+        if 'recherche' not in colonnes:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN recherche TEXT')
+        nb_lignes += indexer_recherche(modele, tout=reconstruire)
+
+        with db.engine.begin() as conn:
+            if dialecte == 'postgresql':
+                conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                conn.exec_driver_sql(
+                    f'CREATE INDEX IF NOT EXISTS ix_{table}_recherche_trgm '
+                    f'ON {table} USING gin (recherche gin_trgm_ops)'
+                )
+            elif dialecte == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34):
+                fts = f'{table}_fts'
+                nouvelle = table_plein_texte(modele) is None
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"recherche, content='{table}', content_rowid='id', tokenize='trigram')"
+                )
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {fts}(rowid, recherche) VALUES (new.id, new.recherche); END"
+                )
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, recherche) VALUES ('delete', old.id, old.recherche); END"
+                )
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF recherche ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, recherche) VALUES ('delete', old.id, old.recherche); "
+                    f"INSERT INTO {fts}(rowid, recherche) VALUES (new.id, new.recherche); END"
+                )
+                # Index créé sur une table déjà remplie (ou reconstruction demandée)
+                if nouvelle or reconstruire:
+                    conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        _tables_plein_texte.clear()
+    return nb_lignes
+
+def rechercher_operations(modele, search):
+    """Recherche classée par pertinence dans une table de ventes.
+
+    Retourne (query, cle_tri, descendant), à passer à paginer_par_curseur.
+    """
+    terme = normaliser_recherche(search)
+    query = modele.query
+    if not terme:
+        return query, None, False
+
+    fts = table_plein_texte(modele)
+    if fts is not None and len(terme) >= TAILLE_MIN_TRIGRAMME:
+        # Le tokenizer trigram cherche la phrase comme sous-chaîne; rank (bm25) est négatif, les meilleurs d'abord
+        phrase = '"' + terme.replace('"', '""') + '"'
+        query = query.join(fts, fts.c.rowid == modele.id).filter(db.literal_column(fts.name).op('MATCH')(phrase))
+        return query, fts.c.rank, False
+
+    query = query.filter(modele.recherche.contains(terme, autoescape=True))
+    if db.engine.dialect.name == 'postgresql':
+        return query, func.word_similarity(terme, modele.recherche), True
+    return query, None, False
+
+# Migrations de schéma: (version, description, fonction), appliquées dans l'ordre des versions.
+# create_all() crée les tables manquantes mais ne modifie pas une table existante.
+MIGRATIONS = []
+
+def migration(version, description):
+    def decorateur(f):
+        MIGRATIONS.append((version, description, f))
+        return f
+    return decorateur
+
+def creer_index_manquants():
+    """Crée les index déclarés dans les modèles qui n'existent pas encore en base"""
+    crees = []
+    for table in db.metadata.sorted_tables:
+        existants = {index['name'] for index in db.inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existants:
+                index.create(db.engine)
+                crees.append(index.name)
+    return crees
+
+@migration(1, "Index des colonnes filtrées et triées par les listes, widgets et cumuls")
+def migration_index_colonnes_frequentes():
+    creer_index_manquants()
+
+@migration(2, "Colonne et index de recherche des tables de ventes")
+def migration_recherche_ventes():
+    installer_index_recherche()
+
+@migration(3, "Index des écritures financières par compte et date")
+def migration_index_finances():
+    creer_index_manquants()
+
+@migration(4, "Compteurs de numérotation des factures repris des numéros existants")
+def migration_compteurs_factures():
+    derniers = {}
+    motif = re.compile(r'FACT-(\d{8})-(\d+)')
+    numeros = db.session.query(Facture.numero_facture).filter(Facture.numero_facture.like('FACT-%'))
+    for (numero,) in numeros.yield_per(10000):
+        trouve = motif.fullmatch(numero)
+        if trouve:
+            periode, rang = trouve.group(1), int(trouve.group(2))
+            derniers[periode] = max(derniers.get(periode, 0), rang)
+    for compteur in CompteurFacture.query:
+        compteur.dernier_numero = max(compteur.dernier_numero, derniers.pop(compteur.periode, 0))
+    if derniers:
+        db.session.execute(CompteurFacture.__table__.insert(), [
+            {'periode': periode, 'dernier_numero': rang} for periode, rang in derniers.items()
+        ])
+
+@migration(5, "Empreinte SHA-256 des fichiers de rapports")
+def migration_empreinte_rapports():
+    colonnes = {c['name'] for c in db.inspect(db.engine).get_columns('rapports')}
+    if 'empreinte_fichier' not in colonnes:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ALTER TABLE rapports ADD COLUMN empreinte_fichier VARCHAR(64)')
+
+@migration(6, "Dates de tri des factures et des rapports renseignées (pagination par curseur)")
+def migration_dates_tri_renseignees():
+    # Une clé de tri NULL rend la comparaison du curseur indéterminée: la ligne n'apparaît sur aucune page suivante
+    date_inconnue = datetime(1970, 1, 1)
+    Facture.query.filter(Facture.date_facture.is_(None)).update(
+        {Facture.date_facture: func.coalesce(Facture.created_at, date_inconnue)}, synchronize_session=False
+    )
+    Rapport.query.filter(Rapport.date_creation.is_(None)).update(
+        {Rapport.date_creation: func.coalesce(Rapport.date_modification, date_inconnue)}, synchronize_session=False
+    )
+    # SQLite ne modifie pas la contrainte d'une colonne existante: les routes ne l'écrivent jamais vide
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('ALTER TABLE factures ALTER COLUMN date_facture SET NOT NULL'))
+        db.session.execute(db.text('ALTER TABLE rapports ALTER COLUMN date_creation SET NOT NULL'))
+
+def appliquer_migrations():
+    """Applique les migrations pas encore enregistrées dans schema_migrations.
+
+    Retourne la liste des (version, description) appliquées.
+    """
+    MigrationSchema.__table__.create(db.engine, checkfirst=True)
+    deja_appliquees = {version for (version,) in db.session.query(MigrationSchema.version)}
+    appliquees = []
+    for version, description, fonction in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in deja_appliquees:
+            continue
+        fonction()
+        db.session.add(MigrationSchema(version=version, description=description))
+        db.session.commit()
+        appliquees.append((version, description))
+    return appliquees
+
+# Requêtes fréquentes des routes, vérifiées par check-index (valeurs de paramètres représentatives)
+REQUETES_CRITIQUES = {
+    'cumul revenus d\'un personnel': lambda: db.session.query(
+        Trading.date_const, func.sum(Trading.montant_ttc)
+    ).filter(Trading.personnel_id == 1).group_by(Trading.date_const),
+    'reconstruction cumul revenus': lambda: db.session.query(
+        Academy.date_const, func.sum(Academy.montant_ttc)
+    ).group_by(Academy.date_const),
+    'personnels révoqués': lambda: db.session.query(Personnel.id, Personnel.date_depart).filter(
+        Personnel.date_depart.isnot(None)
+    ),
+    'activités récentes': lambda: Journal.query.order_by(Journal.date.desc()).limit(10),
+    'top utilisateurs': lambda: db.session.query(func.count(Journal.id)).filter(Journal.personnel_id == 1),
+    'connexions récentes': lambda: db.session.query(UserActivity.id).filter(
+        UserActivity.activity_type == 'login',
+        UserActivity.created_at >= datetime(2025, 1, 1)
+    ),
+    'liste des factures': lambda: Facture.query.order_by(
+        Facture.date_facture.desc(), Facture.id.desc()
+    ).limit(11),
+    'liste des rapports': lambda: Rapport.query.order_by(
+        Rapport.date_creation.desc(), Rapport.id.desc()
+    ).limit(11),
+    'rapports d\'un personnel': lambda: Rapport.query.filter(Rapport.personnel_id == 1).order_by(
+        Rapport.date_creation.desc(), Rapport.id.desc()
+    ).limit(11),
+    'liste des PV': lambda: ProcesVerbal.query.order_by(
+        ProcesVerbal.date_reunion.desc(), ProcesVerbal.id.desc()
+    ).limit(11),
+    'PV par statut': lambda: ProcesVerbal.query.filter(ProcesVerbal.statut == 'validé').order_by(
+        ProcesVerbal.date_reunion.desc(), ProcesVerbal.id.desc()
+    ).limit(11),
+    'participants d\'un PV': lambda: db.session.query(func.count(PVParticipant.id)).filter(
+        PVParticipant.proces_verbal_id == 1
+    ),
+    'projets par statut': lambda: db.session.query(Projet.id).filter(Projet.statut == 'en cours'),
+    'événements à venir': lambda: Evenementiel.query.filter(
+        Evenementiel.date_debut >= datetime(2025, 1, 1).date(),
+        Evenementiel.date_debut <= datetime(2025, 2, 1).date(),
+        Evenementiel.statut.in_(['en attente', 'en cours'])
+    ).order_by(Evenementiel.date_debut).limit(5),
+}
+
+def _parcours_sequentiels(noeud):
+    """Tables parcourues séquentiellement dans un plan PostgreSQL (format JSON)"""
+    tables = [noeud['Relation Name']] if noeud.get('Node Type') == 'Seq Scan' else []
+    for enfant in noeud.get('Plans', []):
+        tables += _parcours_sequentiels(enfant)
+    return tables
+
+def verifier_plans_requetes():
+    """Vérifie par EXPLAIN que chaque requête critique peut s'appuyer sur un index.
+
+    Sous PostgreSQL, les parcours séquentiels sont désactivés pour la vérification:
+    sur une petite table le planificateur les préfère même quand un index existe.
+    Retourne {nom: (ok, détail du plan)}.
+    """
+    dialecte = db.engine.dialect
+    resultats = {}
+    for nom, requete in REQUETES_CRITIQUES.items():
+        sql = str(requete().statement.compile(dialect=dialecte, compile_kwargs={'literal_binds': True}))
+        with db.engine.connect() as conn:
+            if dialecte.name == 'postgresql':
+                conn.exec_driver_sql('SET enable_seqscan = off')
+                plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                sequentiels = _parcours_sequentiels(plan[0]['Plan'])
+                resultats[nom] = (not sequentiels, ', '.join(f'Seq Scan {t}' for t in sequentiels) or 'index')
+            elif dialecte.name == 'sqlite':
+                etapes = [ligne[-1] for ligne in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+                # « SCAN table » sans index = lecture complète de la table
+                sequentiels = [e for e in etapes if e.startswith('SCAN ') and ' USING ' not in e]
+                resultats[nom] = (not sequentiels, '; '.join(etapes))
+            else:
+                plan = [str(ligne) for ligne in conn.exec_driver_sql('EXPLAIN ' + sql)]
+                resultats[nom] = (True, 'non vérifié: ' + '; '.join(plan))
+    return resultats
+
+# Soldes des comptes financiers
+# Le solde est la somme des crédits (recettes) moins celle des débits (dépenses).
+# Les soldes de clôture mensuels (SoldeMensuel) bornent le calcul: le solde à une date est le
+# dernier solde de clôture antérieur plus les écritures du compte depuis cette clôture.
+_cloture_soldes = {}    # dernier mois clôturé et état des soldes en base vus par ce processus
+
+def _compte_finance():
+    return func.coalesce(Finance.numero_compte, '')
+
+def _mouvement_finance():
+    return func.coalesce(Finance.credit, 0) - func.coalesce(Finance.debit, 0)
+
+def _debut_mois(colonne):
+    dialecte = db.engine.dialect.name
+    if dialecte == 'sqlite':
+        return func.date(colonne, 'start of month')
+    if dialecte == 'postgresql':
+        return db.cast(func.date_trunc('month', colonne), db.Date)
+    return func.str_to_date(func.date_format(colonne, '%Y-%m-01'), '%Y-%m-%d')
+
+def _en_date(valeur):
+    if isinstance(valeur, str):    # DATE() renvoie une chaîne sous SQLite
+        return datetime.strptime(valeur[:10], '%Y-%m-%d').date()
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    return valeur
+
+def _mois_suivant(jour):
+    return (jour.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def cloturer_soldes_mensuels(jusqu_au=None):
+    """Enregistre les soldes de clôture manquants des mois terminés (avant `jusqu_au`).
+
+    Seules les écritures postérieures à la dernière clôture de chaque compte sont lues;
+    les mouvements mensuels sont cumulés par une fonction de fenêtre.
+    Retourne le nombre de soldes enregistrés.
+    """
+    fin = (jusqu_au or datetime.now().date()).replace(day=1)
+    derniers = db.session.query(
+        SoldeMensuel.numero_compte.label('compte'),
+        func.max(SoldeMensuel.date_arrete).label('date_arrete')
+    ).group_by(SoldeMensuel.numero_compte).subquery()
+    clotures = db.session.query(
+        SoldeMensuel.numero_compte.label('compte'), SoldeMensuel.date_arrete, SoldeMensuel.solde
+    ).join(
+        derniers, (derniers.c.compte == SoldeMensuel.numero_compte) & (derniers.c.date_arrete == SoldeMensuel.date_arrete)
+    ).subquery()
+
+    compte = _compte_finance()
+    # Les écritures sans date comptent dans la première clôture du compte
+    mois = _debut_mois(func.coalesce(Finance.date, datetime(1970, 1, 1).date()))
+    mouvements = db.session.query(
+        compte.label('compte'),
+        mois.label('mois'),
+        func.coalesce(clotures.c.solde, 0).label('solde_initial'),
+        func.sum(func.sum(_mouvement_finance())).over(partition_by=compte, order_by=mois).label('cumul')
+    ).outerjoin(clotures, clotures.c.compte == compte).filter(
+        (Finance.date < fin) | Finance.date.is_(None),
+        clotures.c.date_arrete.is_(None) | (Finance.date >= clotures.c.date_arrete)
+    ).group_by(compte, mois, clotures.c.solde).all()
+
+    if mouvements:
+        lignes = [
+            {
+                'numero_compte': ligne.compte,
+                'date_arrete': _mois_suivant(_en_date(ligne.mois)),
+                'solde': ligne.solde_initial + (ligne.cumul or 0),
+            }
+            for ligne in mouvements
+        ]
+        # Insertion groupée (executemany): le premier affichage du mois reste dans le budget de requêtes.
+        # Un autre worker peut clôturer le même mois en même temps: ses soldes sont identiques, on garde les siens.
+        table = SoldeMensuel.__table__
+        dialecte = db.engine.dialect.name
+        if dialecte == 'postgresql' or (dialecte == 'sqlite' and sqlite3.sqlite_version_info >= (3, 24)):
+            insert = insert_postgresql if dialecte == 'postgresql' else insert_sqlite
+            db.session.execute(insert(table).on_conflict_do_nothing(
+                index_elements=[table.c.numero_compte, table.c.date_arrete]
+            ), lignes)
+        else:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.insert(), lignes)
+            except IntegrityError:
+                pass
+    return len(mouvements)
+
+def assurer_cloture_soldes():
+    """Clôture les mois terminés au premier affichage du mois dans le processus, puis dès que
+    les soldes enregistrés changent (invalidation par une écriture antérieure, dans n'importe quel worker).
+
+    L'état des soldes (nombre, dernier identifiant) est lu en base: une invalidation supprime des
+    soldes, une clôture en ajoute.
+    """
+    mois = datetime.now().date().replace(day=1)
+    etat = None
+    if _cloture_soldes.get('mois') == mois:
+        etat = tuple(db.session.query(func.count(SoldeMensuel.id), func.max(SoldeMensuel.id)).one())
+        if etat == _cloture_soldes.get('etat'):
+            return
+    if cloturer_soldes_mensuels(mois):
+        db.session.commit()
+        etat = None    # soldes ajoutés: état relu au prochain affichage
+    _cloture_soldes.update(mois=mois, etat=etat)
+
+def invalider_soldes(numero_compte, jour):
+    """Supprime les soldes de clôture rendus faux par une écriture datée de `jour` (None: toutes)"""
+    filtre = SoldeMensuel.numero_compte == (numero_compte or '')
+    if jour is not None:
+        filtre &= SoldeMensuel.date_arrete > jour
+    SoldeMensuel.query.filter(filtre).delete(synchronize_session=False)
+    if jour is None or jour < datetime.now().date().replace(day=1):
+        _cloture_soldes.clear()    # mois déjà clôturé: à recalculer au prochain affichage
+
+def _filtre_compte(numero_compte):
+    """Écritures d'un compte ('' regroupe les écritures sans numéro), sur l'index (compte, date, id)"""
+    if numero_compte:
+        return Finance.numero_compte == numero_compte
+    return Finance.numero_compte.is_(None) | (Finance.numero_compte == '')
+
+def _plage_depuis_cloture(date_arrete, fin):
+    """Écritures à cumuler après la clôture `date_arrete` (None: depuis l'origine) jusqu'à `fin` inclus"""
+    if date_arrete is not None:
+        return (Finance.date >= date_arrete) & (Finance.date <= fin)
+    if fin is None:
+        return Finance.date.is_(None)
+    return Finance.date.is_(None) | (Finance.date <= fin)
+
+def _clotures_precedentes(debuts):
+    """Dernière clôture de chaque compte au plus tard à la date donnée: {compte: (date_arrete, solde)}"""
+    clotures = {}
+    if debuts:
+        for compte, date_arrete, solde in db.session.query(
+            SoldeMensuel.numero_compte, SoldeMensuel.date_arrete, SoldeMensuel.solde
+        ).filter(
+            SoldeMensuel.numero_compte.in_(list(debuts)),
+            SoldeMensuel.date_arrete <= max(debuts.values())
+        ).order_by(SoldeMensuel.date_arrete):
+            if date_arrete <= debuts[compte]:
+                clotures[compte] = (date_arrete, solde)
+    return clotures
+
+def soldes_ecritures(ecritures):
+    """Solde du compte après chaque écriture donnée: {id de l'écriture: solde}.
+
+    Par compte, le calcul part de la clôture précédant la plus ancienne écriture demandée
+    et cumule les écritures suivantes dans l'ordre (date, id) par une fonction de fenêtre.
+    Deux requêtes, quel que soit le nombre d'écritures.
+    """
+    dates_par_compte = {}
+    for ecriture in ecritures:
+        dates_par_compte.setdefault(ecriture.numero_compte or '', []).append(ecriture.date)
+    if not dates_par_compte:
+        return {}
+
+    # Une écriture sans date précède toutes les autres: son solde se calcule depuis l'origine
+    clotures = _clotures_precedentes({
+        compte: min(dates) for compte, dates in dates_par_compte.items() if None not in dates
+    })
+    plages = []
+    for compte, dates in dates_par_compte.items():
+        datees = [d for d in dates if d is not None]
+        date_arrete = clotures.get(compte, (None, 0))[0]
+        plages.append(_filtre_compte(compte) & _plage_depuis_cloture(date_arrete, max(datees) if datees else None))
+
+    cumul = db.session.query(
+        Finance.id.label('id'),
+        _compte_finance().label('compte'),
+        func.sum(_mouvement_finance()).over(
+            partition_by=_compte_finance(),
+            order_by=(case((Finance.date.is_(None), 0), else_=1), Finance.date, Finance.id)
+        ).label('cumul')
+    ).filter(db.or_(*plages)).subquery()
+    return {
+        ligne.id: clotures.get(ligne.compte, (None, 0))[1] + (ligne.cumul or 0)
+        for ligne in db.session.query(cumul).filter(cumul.c.id.in_([e.id for e in ecritures]))
+    }
+
+def solde_compte_au(numero_compte, jour):
+    """Solde d'un compte au soir de `jour`: dernière clôture antérieure + écritures depuis"""
+    numero_compte = numero_compte or ''
+    date_arrete, solde = _clotures_precedentes({numero_compte: jour}).get(numero_compte, (None, 0))
+    mouvements = db.session.query(func.sum(_mouvement_finance())).filter(
+        _filtre_compte(numero_compte),
+        _plage_depuis_cloture(date_arrete, jour)
+    ).scalar()
+    return solde + (mouvements or 0)
+
+# Compte de résultat par département
+# Les ventes (Trading, Academy, Digital) sont les produits des départements. Les achats de matériel
+# (datés de leur réception, à défaut de leur sortie) et les écritures financières (crédits en
+# produits, débits en charges) sont rattachés aux frais communs. Les tables sont lues par lots de
+# colonnes et agrégées par pandas; les écritures sans date n'appartiennent à aucune période.
+DEPARTEMENT_COMMUN = 'Commun'
+DEPARTEMENTS_RESULTAT = tuple(MODELES_REVENUS) + (DEPARTEMENT_COMMUN,)
+COLONNES_RESULTAT = ['produits_ht', 'tva_collectee', 'charges_ht', 'tva_deductible']
+
+def _lots_montants(colonne_date, colonnes, debut, fin, taille_lot):
+    """Lignes datées de [debut, fin[ par lots: DataFrame ('mois' au format AAAA-MM, colonnes en float)"""
+    requete = db.select(
+        func.substr(db.cast(colonne_date, db.String), 1, 7).label('mois'), *colonnes
+    ).where(colonne_date >= debut, colonne_date < fin).execution_options(yield_per=taille_lot)
+    resultat = db.session.connection().execute(requete)    # Core: pas de traitement ORM par ligne
+    noms = list(resultat.keys())
+    for lignes in resultat.partitions():
+        lot = pd.DataFrame.from_records(lignes, columns=noms)
+        yield lot.astype({nom: 'float64' for nom in noms[1:]})
+
+def _ventiler_tva(lot):
+    """Montants HT et TVA (taux en %): HT saisi, sinon déduit du TTC, sinon quantité × prix unitaire"""
+    taux = 1 + lot['tva'].fillna(0) / 100
+    ht = lot['montant_ht'].fillna(lot['montant_ttc'] / taux).fillna(lot['quantite'] * lot['prix_unit'])
+    ttc = lot['montant_ttc'].fillna(ht * taux)
+    return ht.fillna(0), (ttc - ht).fillna(0)
+
+def calculer_resultats(debut, fin, taille_lot=50000):
+    """Produits, charges et TVA par mois et par département sur [debut, fin[.
+
+    Chaque lot est agrégé par mois dès sa lecture; seuls ces cumuls partiels sont conservés.
+    Retourne un DataFrame indexé par (mois, departement) avec les colonnes COLONNES_RESULTAT.
+    """
+    partiels = []
+
+    def cumuler(lot, departement, **montants):
+        montants = pd.DataFrame({'mois': lot['mois'], **dict.fromkeys(COLONNES_RESULTAT, 0.0), **montants})
+        partiels.append(montants.groupby('mois').sum().assign(departement=departement))
+
+    colonnes_ventes = ('quantite', 'prix_unit', 'montant_ht', 'tva', 'montant_ttc')
+    for departement, modele in MODELES_REVENUS.items():
+        colonnes = [getattr(modele, nom) for nom in colonnes_ventes]
+        for lot in _lots_montants(modele.date_const, colonnes, debut, fin, taille_lot):
+            ht, tva = _ventiler_tva(lot)
+            cumuler(lot, departement, produits_ht=ht, tva_collectee=tva)
+
+    date_achat = func.coalesce(Materiel.date_reception, Materiel.date_sortie)
+    colonnes = [getattr(Materiel, nom) for nom in colonnes_ventes]
+    for lot in _lots_montants(date_achat, colonnes, debut, fin, taille_lot):
+        ht, tva = _ventiler_tva(lot)
+        cumuler(lot, DEPARTEMENT_COMMUN, charges_ht=ht, tva_deductible=tva)
+
+    colonnes = [Finance.credit, Finance.debit, Finance.tva]
+    for lot in _lots_montants(Finance.date, colonnes, debut, fin, taille_lot):
+        taux = 1 + lot['tva'].fillna(0) / 100
+        credit, debit = lot['credit'].fillna(0), lot['debit'].fillna(0)
+        cumuler(lot, DEPARTEMENT_COMMUN,
+                produits_ht=credit / taux, tva_collectee=credit - credit / taux,
+                charges_ht=debit / taux, tva_deductible=debit - debit / taux)
+
+    if not partiels:
+        return pd.DataFrame(
+            columns=COLONNES_RESULTAT, dtype='float64',
+            index=pd.MultiIndex.from_tuples([], names=['mois', 'departement'])
+        )
+    return pd.concat(partiels).reset_index().groupby(['mois', 'departement'])[COLONNES_RESULTAT].sum()
+
+def compte_de_resultat(annee):
+    """Cumuls mensuels d'une année: les mois clôturés viennent du cache, le mois en cours est recalculé"""
+    debut, fin = datetime(annee, 1, 1).date(), datetime(annee + 1, 1, 1).date()
+    cloture = min(max(datetime.now().date().replace(day=1), debut), fin)
+    parties = []
+    if cloture > debut:
+        parties.append(cache_resultats.obtenir(
+            ('resultats', debut.isoformat(), cloture.isoformat()),
+            lambda: calculer_resultats(debut, cloture)
+        ))
+    if cloture < fin:
+        parties.append(calculer_resultats(cloture, fin))
+    return pd.concat(parties), cloture
+
+def _indicateurs(cumuls):
+    """Ajoute marge, taux de marge et TVA nette; montants arrondis au centime, valeurs absentes à None"""
+    cumuls = cumuls.assign(
+        marge=cumuls['produits_ht'] - cumuls['charges_ht'],
+        tva_nette=cumuls['tva_collectee'] - cumuls['tva_deductible']
+    ).round(2)
+    cumuls['taux_marge'] = (cumuls['marge'] / cumuls['produits_ht'].where(cumuls['produits_ht'] != 0)).round(4)
+    return cumuls.astype(object).where(cumuls.notna(), None)
+
+def synthese_resultats(annee):
+    """Compte de résultat d'une année par mois et par département, prêt pour le template ou le JSON"""
+    cumuls, cloture = compte_de_resultat(annee)
+    mois = [f'{annee}-{numero:02d}' for numero in range(1, 13)]
+    detail = cumuls.reindex(
+        pd.MultiIndex.from_product([mois, DEPARTEMENTS_RESULTAT], names=['mois', 'departement']),
+        fill_value=0.0
+    )
+    total = _indicateurs(detail.sum().to_frame().T).iloc[0]
+    par_departement = _indicateurs(detail.groupby(level='departement').sum().reindex(DEPARTEMENTS_RESULTAT))
+    par_mois = _indicateurs(detail.groupby(level='mois').sum())
+    detail = _indicateurs(detail)
+    fin_cloture = cloture.strftime('%Y-%m')
+    return {
+        'annee': annee,
+        'departements': list(DEPARTEMENTS_RESULTAT),
+        'mois': [
+            {
+                'mois': m,
+                'cloture': m < fin_cloture,
+                'total': par_mois.loc[m].to_dict(),
+                'departements': {d: detail.loc[(m, d)].to_dict() for d in DEPARTEMENTS_RESULTAT},
+            }
+            for m in mois
+        ],
+        'total_departements': {d: par_departement.loc[d].to_dict() for d in DEPARTEMENTS_RESULTAT},
+        'total': total.to_dict(),
+    }
+
+# Valeurs possibles des colonnes agrégées par le tableau de bord
+DEPARTEMENTS_PERSONNEL = ('Direction', 'Trading', 'Academy', 'Digital')
+CONVENTIONS_PERSONNEL = ('Stage', 'CDD', 'CDI')
+
+@dataclass
+class StatistiquesDashboard:
+    """Compteurs du tableau de bord, calculés en une seule requête"""
+    total_personnel: int
+    personnel_actifs: int
+    personnel_inactifs: int
+    projets_total: int
+    projets_en_cours: int
+    projets_termines: int
+    evenements_total: int
+    evenements_en_cours: int
+    revenus_par_dept: dict    # {departement: montant TTC total}
+    revenus_mois_par_dept: dict    # {departement: montant TTC du mois en cours}
+    dept_stats: list    # [(departement, nombre de personnels)]
+    convention_stats: list    # [(convention, nombre de personnels)]
+
+    @property
+    def revenus_total(self):
+        return sum(self.revenus_par_dept.values())
+
+    @property
+    def revenus_mois(self):
+        return sum(self.revenus_mois_par_dept.values())
+
+def _compter_si(condition):
+    """COUNT conditionnel portable (équivalent de COUNT(*) FILTER (WHERE ...))"""
+    return func.count(case((condition, 1)))
+
+def _sommer_si(condition, colonne):
+    """SUM conditionnel portable"""
+    return func.coalesce(func.sum(case((condition, colonne), else_=0)), 0)
+
+def get_statistiques_dashboard(premier_jour_mois):
+    """Collecte tous les compteurs du tableau de bord en un seul aller-retour.
+
+    Chaque table est agrégée une seule fois dans une sous-requête d'une ligne
+    (agrégats conditionnels), puis les sous-requêtes sont jointes entre elles.
+    """
+    personnels = db.session.query(
+        func.count(Personnel.id).label('personnel_total'),
+        _compter_si(Personnel.date_depart.is_(None)).label('personnel_actifs'),
+        _compter_si(Personnel.date_depart.isnot(None)).label('personnel_inactifs'),
+        *[_compter_si(Personnel.departement == d).label(f'dept_{d}') for d in DEPARTEMENTS_PERSONNEL],
+        *[_compter_si(Personnel.convention == c).label(f'conv_{c}') for c in CONVENTIONS_PERSONNEL]
+    ).subquery()
+    projets = db.session.query(
+        func.count(Projet.id).label('projets_total'),
+        _compter_si(Projet.statut == 'en cours').label('projets_en_cours'),
+        _compter_si(Projet.statut == 'terminé').label('projets_termines')
+    ).subquery()
+    evenements = db.session.query(
+        func.count(Evenementiel.id).label('evenements_total'),
+        _compter_si(Evenementiel.statut == 'en cours').label('evenements_en_cours')
+    ).subquery()
+    revenus = db.session.query(
+        *[_sommer_si(RevenuJournalier.departement == d, RevenuJournalier.montant_ttc).label(f'revenus_{d}')
+          for d in MODELES_REVENUS],
+        *[_sommer_si((RevenuJournalier.departement == d) & (RevenuJournalier.date >= premier_jour_mois),
+                     RevenuJournalier.montant_ttc).label(f'revenus_mois_{d}')
+          for d in MODELES_REVENUS]
+    ).subquery()
+
+    valeurs = db.session.query(personnels, projets, evenements, revenus).select_from(
+        personnels.join(projets, true()).join(evenements, true()).join(revenus, true())
+    ).one()._asdict()
+
+    return StatistiquesDashboard(
+        total_personnel=valeurs['personnel_total'],
+        personnel_actifs=valeurs['personnel_actifs'],
+        personnel_inactifs=valeurs['personnel_inactifs'],
+        projets_total=valeurs['projets_total'],
+        projets_en_cours=valeurs['projets_en_cours'],
+        projets_termines=valeurs['projets_termines'],
+        evenements_total=valeurs['evenements_total'],
+        evenements_en_cours=valeurs['evenements_en_cours'],
+        revenus_par_dept={d: valeurs[f'revenus_{d}'] for d in MODELES_REVENUS},
+        revenus_mois_par_dept={d: valeurs[f'revenus_mois_{d}'] for d in MODELES_REVENUS},
+        # Comme un GROUP BY, on ne garde que les valeurs présentes
+        dept_stats=[(d, valeurs[f'dept_{d}']) for d in DEPARTEMENTS_PERSONNEL if valeurs[f'dept_{d}']],
+        convention_stats=[(c, valeurs[f'conv_{c}']) for c in CONVENTIONS_PERSONNEL if valeurs[f'conv_{c}']]
     )
-    db.session.add(journal)
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _serialiser_valeur(valeur):
+    if isinstance(valeur, datetime):
+        return ['dt', valeur.isoformat()]
+    if hasattr(valeur, 'isoformat'):
+        return ['d', valeur.isoformat()]
+    return valeur
+
+def _deserialiser_valeur(valeur):
+    if isinstance(valeur, list):
+        type_valeur, iso = valeur
+        return datetime.fromisoformat(iso) if type_valeur == 'dt' else datetime.fromisoformat(iso).date()
+    return valeur
+
+def compter_resultats(query, approximatif=True):
+    """Nombre de résultats d'une requête.
+
+    Sous PostgreSQL, le nombre est estimé par le planificateur (EXPLAIN, à partir
+    des statistiques des tables) au lieu d'un COUNT(*) qui parcourt la table.
+    Retourne (nombre, estimé).
+    """
+    query = query.order_by(None)
+    if approximatif and db.engine.dialect.name == 'postgresql':
+        instruction = query.statement.compile(dialect=db.engine.dialect)
+        plan = db.session.connection().exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + str(instruction), instruction.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), True
+    return query.count(), False
+
+class PageCurseur:
+    """Page de résultats obtenue par pagination par curseur (keyset).
+
+    Les curseurs précédent/suivant sont des jetons opaques et signés contenant
+    le sens de parcours et la clé (tri, id) de la ligne de bord de la page.
+    """
+
+    def __init__(self, items, per_page, has_prev, has_next, prev_cursor, next_cursor, query, approximatif):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self._query = query
+        self._approximatif = approximatif
+        self._total = None
+
+    def _compter(self):
+        if self._total is None:
+            if not self.has_prev and not self.has_next:
+                self._total = (len(self.items), False)
+            else:
+                self._total = compter_resultats(self._query, self._approximatif)
+        return self._total
+
+    @property
+    def total(self):
+        return self._compter()[0]
+
+    @property
+    def total_estime(self):
+        return self._compter()[1]
+
+def paginer_par_curseur(query, curseur=None, cle_tri=None, descendant=False, per_page=10, approximatif=True):
+    """Pagine une requête par curseur, triée sur le couple stable (cle_tri, id).
+
+    Contrairement à OFFSET, le coût d'une page ne dépend pas de sa profondeur.
+    """
+    modele = query.column_descriptions[0]['entity']
+    colonnes = [cle_tri, modele.id] if cle_tri is not None else [modele.id]
+    serialiseur = URLSafeSerializer(app.secret_key, salt='pagination')
+
+    sens, valeurs = 'suivant', None
+    if curseur:
+        try:
+            sens, *valeurs = serialiseur.loads(curseur)
+            valeurs = [_deserialiser_valeur(v) for v in valeurs]
+        except (BadSignature, ValueError, TypeError):
+            sens, valeurs = 'suivant', None
+
+    # En arrière, on parcourt dans l'ordre inverse puis on retourne la page
+    inverse = sens == 'precedent'
+    vers_le_bas = descendant != inverse
+    cle = db.tuple_(*colonnes) if len(colonnes) > 1 else colonnes[0]
+    page_query = query
+    if valeurs:
+        borne = db.tuple_(*valeurs) if len(valeurs) > 1 else valeurs[0]
+        page_query = page_query.filter(cle < borne if vers_le_bas else cle > borne)
+    page_query = page_query.order_by(*[c.desc() if vers_le_bas else c.asc() for c in colonnes])
+
+    # La clé de tri est lue avec chaque ligne: elle peut être une expression (score de pertinence)
+    lignes = page_query.add_columns(*colonnes).limit(per_page + 1).all()
+    encore = len(lignes) > per_page
+    lignes = lignes[:per_page]
+    if inverse:
+        lignes.reverse()
+    items = [ligne[0] for ligne in lignes]
+
+    def jeton(sens_jeton, ligne):
+        return serialiseur.dumps([sens_jeton] + [_serialiser_valeur(v) for v in ligne[1:]])
+
+    has_prev = encore if inverse else bool(valeurs)
+    has_next = bool(valeurs) if inverse else encore
+    return PageCurseur(
+        items=items,
+        per_page=per_page,
+        has_prev=has_prev and bool(items),
+        has_next=has_next and bool(items),
+        prev_cursor=jeton('precedent', lignes[0]) if lignes else None,
+        next_cursor=jeton('suivant', lignes[-1]) if lignes else None,
+        query=query,
+        approximatif=approximatif
+    )
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def compter_requete_sql(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'nb_requetes_sql' in g:
+        g.nb_requetes_sql += 1
+
+@app.before_request
+def demarrer_comptage_requetes():
+    if app.testing:
+        g.nb_requetes_sql = 0
+
+@app.after_request
+def verifier_budget_requetes(response):
+    """En mode test, échoue si une page de liste émet plus de LIST_QUERY_BUDGET requêtes.
+
+    Le nombre de requêtes d'une liste doit rester constant quelle que soit la taille
+    de la page (pas de chargement paresseux par ligne, voir PROFILS_CHARGEMENT).
+    """
+    if 'nb_requetes_sql' in g and (request.endpoint or '').endswith('_list'):
+        budget = app.config['LIST_QUERY_BUDGET']
+        if g.nb_requetes_sql > budget:
+            raise AssertionError(
+                f"{request.endpoint}: {g.nb_requetes_sql} requêtes SQL pour une limite de {budget}"
+            )
+    return response
 
 # Routes à ajouter à votre application Flask après les modèles
-@app.route('/')
-@login_required
-def dashboard():
-    # Statistiques générales
-    total_personnel = Personnel.query.count()
-    personnel_actifs = Personnel.query.filter(Personnel.date_depart.is_(None)).count()
-    personnel_inactifs = Personnel.query.filter(Personnel.date_depart.isnot(None)).count()
-    
-    # Statistiques des projets
-    projets_en_cours = Projet.query.filter(Projet.statut == 'en cours').count()
-    projets_termines = Projet.query.filter(Projet.statut == 'terminé').count()
-    projets_total = Projet.query.count()
-    
-    # Statistiques des événements
-    evenements_en_cours = Evenementiel.query.filter(Evenementiel.statut == 'en cours').count()
-    evenements_total = Evenementiel.query.count()
-    
-    # Revenus par département (somme des montants TTC)
-    revenus_trading = db.session.query(func.sum(Trading.montant_ttc)).scalar() or 0
-    revenus_academy = db.session.query(func.sum(Academy.montant_ttc)).scalar() or 0
-    revenus_digital = db.session.query(func.sum(Digital.montant_ttc)).scalar() or 0
-    revenus_total = revenus_trading + revenus_academy + revenus_digital
-    
-    # Revenus du mois en cours
-    premier_jour_mois = datetime.now().replace(day=1).date()
-    revenus_mois_trading = db.session.query(func.sum(Trading.montant_ttc)).filter(
-        Trading.date_const >= premier_jour_mois
-    ).scalar() or 0
-    revenus_mois_academy = db.session.query(func.sum(Academy.montant_ttc)).filter(
-        Academy.date_const >= premier_jour_mois
-    ).scalar() or 0
-    revenus_mois_digital = db.session.query(func.sum(Digital.montant_ttc)).filter(
-        Digital.date_const >= premier_jour_mois
-    ).scalar() or 0
-    revenus_mois = revenus_mois_trading + revenus_mois_academy + revenus_mois_digital
-    
-    # Statistiques par département
-    dept_stats = db.session.query(
-        Personnel.departement,
-        func.count(Personnel.id)
-    ).group_by(Personnel.departement).all()
-    
-    # Statistiques par convention
-    convention_stats = db.session.query(
-        Personnel.convention,
-        func.count(Personnel.id)
-    ).group_by(Personnel.convention).all()
-    
-    # Derniers personnels ajoutés (actifs seulement)
-    recent_personnel = Personnel.query.filter(
-        Personnel.date_depart.is_(None)
-    ).order_by(Personnel.date_arrivee.desc()).limit(5).all()
-    
-    # Activités récentes du journal (10 dernières)
-    recent_activities = Journal.query.join(Personnel).order_by(
-        Journal.date.desc()
-    ).limit(10).all()
-    
-    # Statistiques des connexions des 7 derniers jours
+def statistiques_dashboard_en_cache():
+    """Compteurs agrégés partagés par plusieurs widgets (une requête par version des données)"""
+    def calculer():
+        premier_jour_mois = datetime.now().replace(day=1).date()
+        return get_statistiques_dashboard(premier_jour_mois)
+    return cache_dashboard.obtenir(('statistiques',), calculer)
+
+def widget_compteurs():
+    stats = statistiques_dashboard_en_cache()
+    return {
+        'total_personnel': stats.total_personnel,
+        'personnel_actifs': stats.personnel_actifs,
+        'personnel_inactifs': stats.personnel_inactifs,
+        'projets_en_cours': stats.projets_en_cours,
+        'projets_termines': stats.projets_termines,
+        'projets_total': stats.projets_total,
+        'evenements_en_cours': stats.evenements_en_cours,
+        'evenements_total': stats.evenements_total,
+        'revenus_total': stats.revenus_total,
+        'revenus_mois': stats.revenus_mois
+    }
+
+def widget_departements():
+    stats = statistiques_dashboard_en_cache()
+    return {
+        'departements': [{'name': dept, 'count': count} for dept, count in stats.dept_stats],
+        'conventions': [{'name': conv, 'count': count} for conv, count in stats.convention_stats]
+    }
+
+def widget_revenus():
+    stats = statistiques_dashboard_en_cache()
+    return {
+        'revenus_par_dept': [
+            {'departement': departement, 'montant': montant}
+            for departement, montant in stats.revenus_par_dept.items()
+        ],
+        'revenus_total': stats.revenus_total
+    }
+
+def widget_connexions():
+    """Nombre de connexions par jour sur les 7 derniers jours"""
     seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
     connexions_query = db.session.query(
         db.func.date(UserActivity.created_at).label('date'),
@@ -432,7 +1926,6 @@ def dashboard():
     jours_fr = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
     connexions_par_jour = {}
     connexions_labels = []
-    connexions_data = []
     
     for i in range(7):
         date = (datetime.now(timezone.utc) - timedelta(days=6-i)).date()
@@ -440,17 +1933,37 @@ def dashboard():
         connexions_par_jour[date.strftime('%Y-%m-%d')] = 0
         connexions_labels.append(jour_semaine)
 
-    # Remplir avec les données réelles
+    # Remplir avec les données réelles (DATE() renvoie une chaîne sous SQLite)
     for date, count in connexions_query:
-        connexions_par_jour[date.strftime('%Y-%m-%d')] = count
+        connexions_par_jour[str(date)[:10]] = count
     
-    # Créer la liste des données dans l'ordre
-    for i in range(7):
-        date = (datetime.now(timezone.utc) - timedelta(days=6-i)).date()
-        date_str = date.strftime('%Y-%m-%d')
-        connexions_data.append(connexions_par_jour.get(date_str, 0))
+    return {
+        'labels': connexions_labels,
+        'data': list(connexions_par_jour.values())
+    }
+
+def widget_activites():
+    """Activités récentes du journal (10 dernières)"""
+    activites = db.session.query(
+        Journal.action, Journal.description, Journal.date, Personnel.nom, Personnel.prenom
+    ).join(Personnel, Journal.personnel_id == Personnel.id).order_by(
+        Journal.date.desc()
+    ).limit(10).all()
+    return {
+        'activites': [
+            {
+                'action': a.action,
+                'description': a.description,
+                'date': a.date.strftime('%d/%m/%Y %H:%M') if a.date else None,
+                'nom': a.nom,
+                'prenom': a.prenom
+            }
+            for a in activites
+        ]
+    }
 
-    # Top 5 des utilisateurs les plus actifs (par nombre d'activités)
+def widget_top_utilisateurs():
+    """Top 5 des utilisateurs les plus actifs (par nombre d'activités)"""
     top_users = db.session.query(
         Personnel.nom,
         Personnel.prenom,
@@ -459,23 +1972,32 @@ def dashboard():
     ).join(Journal).group_by(
         Personnel.id, Personnel.nom, Personnel.prenom, Personnel.departement
     ).order_by(func.count(Journal.id).desc()).limit(5).all()
-    
-    # Répartition des revenus par département
-    revenus_par_dept = [
-        {'departement': 'Trading', 'montant': revenus_trading},
-        {'departement': 'Academy', 'montant': revenus_academy},
-        {'departement': 'Digital', 'montant': revenus_digital}
-    ]
-    
-    # Prochains événements (dans les 30 prochains jours)
+    return {'utilisateurs': [u._asdict() for u in top_users]}
+
+def widget_evenements():
+    """Prochains événements (dans les 30 prochains jours)"""
     dans_30_jours = datetime.now().date() + timedelta(days=30)
     prochains_evenements = Evenementiel.query.filter(
         Evenementiel.date_debut >= datetime.now().date(),
         Evenementiel.date_debut <= dans_30_jours,
         Evenementiel.statut.in_(['en attente', 'en cours'])
     ).order_by(Evenementiel.date_debut).limit(5).all()
+    return {
+        'evenements': [
+            {
+                'id': e.id,
+                'nom': e.nom,
+                'date_debut': e.date_debut.isoformat(),
+                'date_fin': e.date_fin.isoformat() if e.date_fin else None,
+                'statut': e.statut,
+                'departement': e.departement
+            }
+            for e in prochains_evenements
+        ]
+    }
 
-    # Utilisateurs connectés aujourd'hui
+def widget_connexions_aujourd_hui():
+    """Utilisateurs connectés aujourd'hui"""
     aujourd_hui = datetime.now(timezone.utc).date()
     debut_journee = datetime.combine(aujourd_hui, time.min).replace(tzinfo=timezone.utc)
     fin_journee = datetime.combine(aujourd_hui, time.max).replace(tzinfo=timezone.utc)
@@ -498,66 +2020,65 @@ def dashboard():
         UserActivity.created_at.desc()
     ).limit(10).all()
 
-    # Formatage des données pour l'affichage
-    utilisateurs_connectes_aujourd_hui = []
-    for connexion in connexions_aujourd_hui:
-        utilisateur = {
-            'personnel_id': connexion.personnel_id,
-            'ip_address': connexion.ip_address or 'Non disponible',
-            'heure_connexion': connexion.created_at.strftime('%H:%M:%S'),
-            'nom': connexion.nom,
-            'prenom': connexion.prenom,
-            'departement': connexion.departement,
-            'datetime_connexion': connexion.created_at
-        }
-        utilisateurs_connectes_aujourd_hui.append(utilisateur)
-    
-    return render_template('dashboard.html',
-                         # Statistiques de base
-                         total_personnel=total_personnel,
-                         personnel_actifs=personnel_actifs,
-                         personnel_inactifs=personnel_inactifs,
-                         
-                         # Projets et événements
-                         projets_en_cours=projets_en_cours,
-                         projets_termines=projets_termines,
-                         projets_total=projets_total,
-                         evenements_en_cours=evenements_en_cours,
-                         evenements_total=evenements_total,
-                         
-                         # Finances
-                         revenus_total=revenus_total,
-                         revenus_mois=revenus_mois,
-                         revenus_par_dept=revenus_par_dept,
-                         
-                         # Graphiques
-                         dept_stats=dept_stats,
-                         convention_stats=convention_stats,
-                         connexions_labels=connexions_labels,
-                         connexions_data=connexions_data,
-                         
-                         # Listes
-                         recent_personnel=recent_personnel,
-                         recent_activities=recent_activities,
-                         top_users=top_users,
-                         prochains_evenements=prochains_evenements,
-                         utilisateurs_connectes_aujourd_hui=utilisateurs_connectes_aujourd_hui)
+    return {
+        'utilisateurs': [
+            {
+                'personnel_id': connexion.personnel_id,
+                'ip_address': connexion.ip_address or 'Non disponible',
+                'heure_connexion': connexion.created_at.strftime('%H:%M:%S'),
+                'nom': connexion.nom,
+                'prenom': connexion.prenom,
+                'departement': connexion.departement
+            }
+            for connexion in connexions_aujourd_hui
+        ]
+    }
+
+# Widgets du tableau de bord: fonction de calcul et durée de cache navigateur (secondes).
+# Une durée nulle force la revalidation par ETag à chaque affichage.
+WIDGETS_DASHBOARD = {
+    'compteurs': (widget_compteurs, 15),
+    'departements': (widget_departements, 120),
+    'revenus': (widget_revenus, 15),
+    'connexions': (widget_connexions, 60),
+    'activites': (widget_activites, 0),
+    'top-utilisateurs': (widget_top_utilisateurs, 120),
+    'evenements': (widget_evenements, 300),
+    'connexions-aujourdhui': (widget_connexions_aujourd_hui, 0),
+}
+
+@app.route('/')
+@login_required
+def dashboard():
+    # Le squelette est rendu sans requête; chaque widget est chargé par /api/dashboard/<widget>
+    return render_template('dashboard.html', widgets=list(WIDGETS_DASHBOARD))
+
+@app.route('/api/dashboard/<widget>')
+@login_required
+def dashboard_widget(widget):
+    if widget not in WIDGETS_DASHBOARD:
+        return jsonify({'error': 'Widget inconnu'}), 404
+    
+    calcul, max_age = WIDGETS_DASHBOARD[widget]
+    response = jsonify(cache_dashboard.obtenir(('widget', widget, session['role']), calcul))
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/journal')
 @login_required
 @admin_required
 def journal_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
-    query = Journal.query
+    query = Journal.query.options(*PROFILS_CHARGEMENT['journal_list'])
     if search:
         query = query.filter(
             (Journal.action.contains(search)) |
             (Journal.description.contains(search))
         )
-    journals = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    journals = paginer_par_curseur(query, curseur=curseur)
     return render_template('journal/list.html', journals=journals, search=search)
 
 # TRADING
@@ -565,21 +2086,10 @@ def journal_list():
 @login_required
 @role_required('Trading')
 def trading_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
-    query = Trading.query
-    if search:
-        query = query.filter(
-            (Trading.nom_client.contains(search)) |
-            (Trading.prenom_client.contains(search)) |
-            (Trading.email_client.contains(search)) |
-            (Trading.phone_client.contains(search)) |
-            (Trading.type_libelle.contains(search)) |
-            (Trading.items.contains(search))
-        )
-    tradings = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    query, cle_tri, descendant = rechercher_operations(Trading, search)
+    tradings = paginer_par_curseur(query, curseur=curseur, cle_tri=cle_tri, descendant=descendant)
     return render_template('trading/list.html', tradings=tradings, search=search, min=min)
 
 @app.route('/trading/create', methods=['GET', 'POST'])
@@ -608,6 +2118,7 @@ def trading_create():
             )
             db.session.add(trading)
             db.session.flush()  # Pour obtenir l'ID du trading créé
+            maj_revenu_journalier('Trading', trading.date_const, trading.montant_ttc)
             
             # Enregistrement dans le journal
             log_activity(
@@ -636,6 +2147,7 @@ def trading_edit(id):
     trading = Trading.query.get_or_404(id)
     if request.method == 'POST':
         try:
+            ancienne_date, ancien_montant = trading.date_const, trading.montant_ttc
             trading.date_const = datetime.strptime(request.form['date_const'], '%Y-%m-%d').date() if request.form.get('date_const') else None
             trading.type_libelle = request.form.get('type_libelle')
             trading.nom_client = request.form.get('nom_client')
@@ -651,6 +2163,7 @@ def trading_edit(id):
             trading.modalite_paiement = request.form.get('modalite_paiement')
             trading.type_paiement = request.form.get('type_paiement', 'Especes')
             trading.observations = request.form.get('observations')
+            deplacer_revenu_journalier('Trading', ancienne_date, ancien_montant, trading.date_const, trading.montant_ttc)
 
             # Enregistrement dans le journal
             log_activity(
@@ -677,6 +2190,7 @@ def trading_delete(id):
             action='SUPPRESSION_TRADING',
             description=f"Suppression du trading ID: {trading.id} - Client: {trading.nom_client} {trading.prenom_client}"
         )
+        maj_revenu_journalier('Trading', trading.date_const, -(trading.montant_ttc or 0), -1)
         db.session.delete(trading)
         db.session.commit()
         flash('Trading supprimé avec succès!', 'success')
@@ -690,21 +2204,10 @@ def trading_delete(id):
 @login_required
 @role_required('Academy')
 def academy_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
-    query = Academy.query
-    if search:
-        query = query.filter(
-            (Academy.nom_client.contains(search)) |
-            (Academy.prenom_client.contains(search)) |
-            (Academy.email_client.contains(search)) |
-            (Academy.phone_client.contains(search)) |
-            (Academy.type_libelle.contains(search)) |
-            (Academy.items.contains(search))
-        )
-    academies = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    query, cle_tri, descendant = rechercher_operations(Academy, search)
+    academies = paginer_par_curseur(query, curseur=curseur, cle_tri=cle_tri, descendant=descendant)
     return render_template('academy/list.html', academies=academies, search=search, min=min)
 
 @app.route('/academy/create', methods=['GET', 'POST'])
@@ -733,6 +2236,7 @@ def academy_create():
             )
             db.session.add(academy)
             db.session.flush()  # Pour obtenir l'ID de l'academy créé
+            maj_revenu_journalier('Academy', academy.date_const, academy.montant_ttc)
             # Enregistrement dans le journal
             log_activity(
                 action='CREATION_ACADEMY',
@@ -761,6 +2265,7 @@ def academy_edit(id):
     academy = Academy.query.get_or_404(id)
     if request.method == 'POST':
         try:
+            ancienne_date, ancien_montant = academy.date_const, academy.montant_ttc
             academy.date_const = datetime.strptime(request.form['date_const'], '%Y-%m-%d').date() if request.form.get('date_const') else None
             academy.type_libelle = request.form.get('type_libelle')
             academy.nom_client = request.form.get('nom_client')
@@ -776,6 +2281,7 @@ def academy_edit(id):
             academy.modalite_paiement = request.form.get('modalite_paiement')
             academy.type_paiement = request.form.get('type_paiement', 'Especes')
             academy.observations = request.form.get('observations')
+            deplacer_revenu_journalier('Academy', ancienne_date, ancien_montant, academy.date_const, academy.montant_ttc)
             # Enregistrement dans le journal
             log_activity(
                 action='MISE_A_JOUR_ACADEMY',
@@ -801,6 +2307,7 @@ def academy_delete(id):
             description=f"Suppression de l'academy ID: {academy.id} - Client: {academy.nom_client} {academy.prenom_client}",
         )
 
+        maj_revenu_journalier('Academy', academy.date_const, -(academy.montant_ttc or 0), -1)
         db.session.delete(academy)
         db.session.commit()
         flash('Academy supprimé avec succès!', 'success')
@@ -814,21 +2321,10 @@ def academy_delete(id):
 @login_required
 @role_required('Digital')
 def digital_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
-    query = Digital.query
-    if search:
-        query = query.filter(
-            (Digital.nom_client.contains(search)) |
-            (Digital.prenom_client.contains(search)) |
-            (Digital.email_client.contains(search)) |
-            (Digital.phone_client.contains(search)) |
-            (Digital.type_libelle.contains(search)) |
-            (Digital.items.contains(search))
-        )
-    digitals = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    query, cle_tri, descendant = rechercher_operations(Digital, search)
+    digitals = paginer_par_curseur(query, curseur=curseur, cle_tri=cle_tri, descendant=descendant)
     return render_template('digital/list.html', digitals=digitals, search=search, min=min)
 
 @app.route('/digital/create', methods=['GET', 'POST'])
@@ -857,6 +2353,7 @@ def digital_create():
             )
             db.session.add(digital)
             db.session.flush()  # Pour obtenir l'ID du digital créé
+            maj_revenu_journalier('Digital', digital.date_const, digital.montant_ttc)
             # Enregistrement dans le journal
             log_activity(
                 action='CREATION_DIGITAL',
@@ -885,6 +2382,7 @@ def digital_edit(id):
     digital = Digital.query.get_or_404(id)
     if request.method == 'POST':
         try:
+            ancienne_date, ancien_montant = digital.date_const, digital.montant_ttc
             digital.date_const = datetime.strptime(request.form['date_const'], '%Y-%m-%d').date() if request.form.get('date_const') else None
             digital.type_libelle = request.form.get('type_libelle')
             digital.nom_client = request.form.get('nom_client')
@@ -900,6 +2398,7 @@ def digital_edit(id):
             digital.modalite_paiement = request.form.get('modalite_paiement')
             digital.type_paiement = request.form.get('type_paiement', 'Especes')
             digital.observations = request.form.get('observations')
+            deplacer_revenu_journalier('Digital', ancienne_date, ancien_montant, digital.date_const, digital.montant_ttc)
             # Enregistrement dans le journal
             log_activity(
                 action='MISE_A_JOUR_DIGITAL',
@@ -924,6 +2423,7 @@ def digital_delete(id):
             action='SUPPRESSION_DIGITAL',
             description=f"Suppression du digital ID: {digital.id} - Client: {digital.nom_client} {digital.prenom_client}",
         )
+        maj_revenu_journalier('Digital', digital.date_const, -(digital.montant_ttc or 0), -1)
         db.session.delete(digital)
         db.session.commit()
         flash('Digital supprimé avec succès!', 'success')
@@ -933,21 +2433,23 @@ def digital_delete(id):
     return redirect(url_for('digital_list'))
 
 # MATERIELS
-@app.route('/materiels')
-@login_required
-@role_required('Comptabilite')
-def materiel_list():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '', type=str)
+def requete_materiels(search=''):
+    """Matériels filtrés par la recherche de la liste (partagée avec l'export)"""
     query = Materiel.query
     if search:
         query = query.filter(
             (Materiel.nom_produit.contains(search)) |
             (Materiel.fournisseur.contains(search))
         )
-    materiels = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    return query
+
+@app.route('/materiels')
+@login_required
+@role_required('Comptabilite')
+def materiel_list():
+    curseur = request.args.get('curseur', '', type=str)
+    search = request.args.get('search', '', type=str)
+    materiels = paginer_par_curseur(requete_materiels(search), curseur=curseur)
     return render_template('materiel/list.html', materiels=materiels, search=search, min=min)
 
 @app.route('/materiel/create', methods=['GET', 'POST'])
@@ -970,6 +2472,7 @@ def materiel_create():
             )
             db.session.add(materiel)
             db.session.flush()  # Pour obtenir l'ID du matériel créé
+            marquer_resultats_modifies(materiel.date_reception or materiel.date_sortie)
             # Enregistrement dans le journal
             log_activity(
                 action='CREATION_MATERIEL',
@@ -997,6 +2500,7 @@ def materiel_edit(id):
     materiel = Materiel.query.get_or_404(id)
     if request.method == 'POST':
         try:
+            ancienne_date = materiel.date_reception or materiel.date_sortie
             materiel.nom_produit = request.form['nom_produit']
             materiel.fournisseur = request.form.get('fournisseur')
             materiel.date_sortie = datetime.strptime(request.form['date_sortie'], '%Y-%m-%d').date() if request.form.get('date_sortie') else None
@@ -1007,6 +2511,7 @@ def materiel_edit(id):
             materiel.tva = float(request.form['tva']) if request.form.get('tva') else None
             materiel.montant_ttc = float(request.form['montant_ttc']) if request.form.get('montant_ttc') else None
             materiel.observations = request.form.get('observations')
+            marquer_resultats_modifies(ancienne_date, materiel.date_reception or materiel.date_sortie)
             # Enregistrement dans le journal
             log_activity(
                 action='MISE_A_JOUR_MATERIEL',
@@ -1031,6 +2536,7 @@ def materiel_delete(id):
             action='SUPPRESSION_MATERIEL',
             description=f"Suppression du matériel ID: {materiel.id} - Produit: {materiel.nom_produit}"
         )
+        marquer_resultats_modifies(materiel.date_reception or materiel.date_sortie)
         db.session.delete(materiel)
         db.session.commit()
         flash('Matériel supprimé avec succès!', 'success')
@@ -1040,22 +2546,26 @@ def materiel_delete(id):
     return redirect(url_for('materiel_list'))
 
 # FINANCES
-@app.route('/finances')
-@login_required
-@role_required('Comptabilite')
-def finance_list():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '', type=str)
+def requete_finances(search=''):
+    """Écritures financières filtrées par la recherche de la liste (partagée avec l'export)"""
     query = Finance.query
     if search:
         query = query.filter(
             (Finance.libelle.contains(search)) | 
             (Finance.numero_compte.contains(search))
         )
-    finances = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
-    return render_template('finance/list.html', finances=finances, search=search, min=min)
+    return query
+
+@app.route('/finances')
+@login_required
+@role_required('Comptabilite')
+def finance_list():
+    curseur = request.args.get('curseur', '', type=str)
+    search = request.args.get('search', '', type=str)
+    assurer_cloture_soldes()
+    finances = paginer_par_curseur(requete_finances(search), curseur=curseur)
+    soldes = soldes_ecritures(finances.items)
+    return render_template('finance/list.html', finances=finances, soldes=soldes, search=search, min=min)
 
 @app.route('/finance/create', methods=['GET', 'POST'])
 @login_required
@@ -1076,6 +2586,8 @@ def finance_create():
             )
             db.session.add(finance)
             db.session.flush()  # Pour obtenir l'ID de la finance créée
+            invalider_soldes(finance.numero_compte, finance.date)
+            marquer_resultats_modifies(finance.date)
             # Enregistrement dans le journal
             log_activity(
                 action='CREATION_FINANCE',
@@ -1094,7 +2606,11 @@ def finance_create():
 @role_required('Comptabilite')
 def finance_detail(id):
     finance = Finance.query.get_or_404(id)
-    return render_template('finance/detail.html', finance=finance, datetime=datetime, timezone=timezone)
+    assurer_cloture_soldes()
+    solde_ecriture = soldes_ecritures([finance]).get(finance.id)
+    solde_compte = solde_compte_au(finance.numero_compte, datetime.now().date())
+    return render_template('finance/detail.html', finance=finance, solde_ecriture=solde_ecriture,
+                           solde_compte=solde_compte, datetime=datetime, timezone=timezone)
 
 @app.route('/finance/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -1103,6 +2619,7 @@ def finance_edit(id):
     finance = Finance.query.get_or_404(id)
     if request.method == 'POST':
         try:
+            ancien_compte, ancienne_date = finance.numero_compte, finance.date
             finance.date = datetime.strptime(request.form['date'], '%Y-%m-%d').date() if request.form.get('date') else None
             finance.libelle = request.form.get('libelle')
             finance.numero_compte = request.form.get('numero_compte')
@@ -1112,6 +2629,9 @@ def finance_edit(id):
             finance.tva = float(request.form['tva']) if request.form.get('tva') else None
             finance.montant_ttc = float(request.form['montant_ttc']) if request.form.get('montant_ttc') else None
             finance.observations = request.form.get('observations')
+            invalider_soldes(ancien_compte, ancienne_date)
+            invalider_soldes(finance.numero_compte, finance.date)
+            marquer_resultats_modifies(ancienne_date, finance.date)
             # Enregistrement dans le journal
             log_activity(
                 action='MISE_A_JOUR_FINANCE',
@@ -1137,6 +2657,8 @@ def finance_delete(id):
             action='SUPPRESSION_FINANCE',
             description=f"Suppression de la finance ID: {finance.id} - Libellé: {finance.libelle}"
         )
+        invalider_soldes(finance.numero_compte, finance.date)
+        marquer_resultats_modifies(finance.date)
         db.session.delete(finance)
         db.session.commit()
         flash('Finance supprimée avec succès!', 'success')
@@ -1145,12 +2667,36 @@ def finance_delete(id):
         flash(f'Erreur lors de la suppression de la finance: {str(e)}', 'error')
     return redirect(url_for('finance_list'))
 
+# Compte de résultat
+def annee_demandee():
+    annee = request.args.get('annee', datetime.now().year, type=int)
+    if not 1900 <= annee <= 9999:
+        abort(400)
+    return annee
+
+@app.route('/finances/resultats')
+@login_required
+@role_required('Comptabilite')
+def finance_resultats():
+    annee = annee_demandee()
+    return render_template('finance/resultats.html', resultats=synthese_resultats(annee))
+
+@app.route('/api/resultats')
+@login_required
+@role_required('Comptabilite')
+def api_resultats():
+    response = jsonify(synthese_resultats(annee_demandee()))
+    response.cache_control.private = True
+    response.cache_control.max_age = 0
+    response.add_etag()
+    return response.make_conditional(request)
+
 # Personnels
 @app.route('/personnels')
 @login_required
 @role_required('Administrator')
 def personnel_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
     departement = request.args.get('departement', '', type=str)
     
@@ -1167,9 +2713,7 @@ def personnel_list():
     if departement:
         query = query.filter(Personnel.departement == departement)
     
-    personnel = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    personnel = paginer_par_curseur(query, curseur=curseur)
     
     return render_template('personnel/list.html', personnel=personnel, search=search, departement=departement, min=min)
 
@@ -1299,6 +2843,8 @@ def personnel_edit(id):
             else:
                 personnel.date_depart = None
             
+            marquer_acces_modifies()
+            
             # Enregistrement dans le journal
             log_activity(
                 action='MISE_A_JOUR_PERSONNEL',
@@ -1327,6 +2873,8 @@ def personnel_delete(id):
             action='SUPPRESSION_PERSONNEL',
             description=f"Suppression du personnel ID: {personnel.id} - Nom: {personnel.nom} {personnel.prenom}",
         )
+        retirer_revenus_personnel(personnel.id)
+        marquer_acces_modifies()
         db.session.delete(personnel)
         db.session.commit()
         flash('Personnel supprimé avec succès!', 'success')
@@ -1341,7 +2889,7 @@ def personnel_delete(id):
 @login_required
 @role_required('Administrator', 'Trading', 'Academy', 'Digital')
 def projet_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
     departement = request.args.get('departement', '', type=str)
     query = Projet.query
@@ -1354,9 +2902,7 @@ def projet_list():
     if departement:
         query = query.filter(Projet.departement == departement)
     
-    projets = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    projets = paginer_par_curseur(query, curseur=curseur)
     return render_template('projet/list.html', projets=projets, search=search, departement=departement, min=min)
 
 @app.route('/projet/create', methods=['GET', 'POST'])
@@ -1447,7 +2993,7 @@ def projet_delete(id):
 @login_required
 @role_required('Administrator', 'Trading', 'Academy', 'Digital')
 def evenementiel_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
     departement = request.args.get('departement', '', type=str)
     query = Evenementiel.query
@@ -1459,9 +3005,7 @@ def evenementiel_list():
         )
     if departement:
         query = query.filter(Evenementiel.departement == departement)
-    evenementiels = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    evenementiels = paginer_par_curseur(query, curseur=curseur)
     return render_template('evenementiel/list.html', evenementiels=evenementiels, search=search, departement=departement, min=min)
 
 @app.route('/evenementiel/create', methods=['GET', 'POST'])
@@ -1551,14 +3095,14 @@ def evenementiel_delete(id):
 @app.route('/rapports')
 @login_required
 def rapport_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
     
     # Chaque utilisateur ne voit que ses propres rapports (sauf admin)
     if session['role'] == 'Administrator':
-        query = Rapport.query.join(Personnel)
+        query = Rapport.query.join(Personnel).options(*PROFILS_CHARGEMENT['rapport_list_admin'])
     else:
-        query = Rapport.query.filter(Rapport.personnel_id == session['id'])
+        query = Rapport.query.filter(Rapport.personnel_id == session['id']).options(*PROFILS_CHARGEMENT['rapport_list'])
     
     if search:
         if session['role'] == 'Administrator':
@@ -1574,56 +3118,423 @@ def rapport_list():
                 (Rapport.description.contains(search))
             )
     
-    rapports = query.order_by(Rapport.date_creation.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    rapports = paginer_par_curseur(query, curseur=curseur, cle_tri=Rapport.date_creation, descendant=True)
     return render_template('rapport/list.html', rapports=rapports, search=search, min=min)
 
+# Réception des fichiers de rapports
+# Le fichier d'un formulaire de rapport est écrit au fil de la lecture de la requête dans
+# DOSSIER_TELEVERSEMENTS, puis renommé à son emplacement définitif: ni copie ni fichier
+# temporaire intermédiaire, et la réception s'arrête dès que MAX_FILE_SIZE est dépassé.
+# Les gros fichiers peuvent aussi être envoyés par morceaux (/rapport/televersements), avec
+# reprise après une coupure; le formulaire ne transmet alors que l'identifiant de l'envoi.
+TAILLE_MORCEAU_TELEVERSEMENT = 64 * 1024
+
+class FichierTeleverse:
+    """Fichier reçu, écrit sous un nom provisoire; taille et SHA-256 calculés pendant l'écriture.
+
+    Dépasser taille_max lève RequestEntityTooLarge. Sans appel à conserver(), un fichier
+    provisoire est supprimé à la fermeture.
+    """
+
+    def __init__(self, chemin, taille_max, mode='x+b', provisoire=True):
+        self.chemin = chemin
+        self.taille_max = taille_max
+        self.provisoire = provisoire
+        self.taille = 0
+        self._sha256 = hashlib.sha256()
+        self._fichier = open(chemin, mode)
+
+    @classmethod
+    def creer(cls, dossier, taille_max):
+        return cls(os.path.join(dossier, f'{os.urandom(16).hex()}.partiel'), taille_max)
+
+    @classmethod
+    def reprendre(cls, chemin, taille, taille_max):
+        """Fichier déjà écrit (envoi par morceaux): relu une fois pour l'empreinte, conservé en cas d'échec"""
+        fichier = cls(chemin, taille_max, mode='r+b', provisoire=False)
+        fichier._fichier.truncate(taille)
+        for morceau in iter(lambda: fichier._fichier.read(TAILLE_MORCEAU_TELEVERSEMENT), b''):
+            fichier._compter(morceau)
+        return fichier
+
+    @property
+    def empreinte(self):
+        return self._sha256.hexdigest()
+
+    def _compter(self, donnees):
+        self.taille += len(donnees)
+        if self.taille > self.taille_max:
+            self.close()
+            raise RequestEntityTooLarge()
+        self._sha256.update(donnees)
+
+    def write(self, donnees):
+        self._compter(donnees)
+        return self._fichier.write(donnees)
+
+    def __getattr__(self, nom):
+        # read, seek, tell... (FileStorage)
+        return getattr(self._fichier, nom)
+
+    def conserver(self, chemin):
+        """Donne au fichier son emplacement définitif"""
+        self._fichier.close()
+        os.replace(self.chemin, chemin)
+        self.chemin = chemin
+        self.provisoire = False
+
+    def close(self):
+        self._fichier.close()
+        if self.provisoire and os.path.exists(self.chemin):
+            os.remove(self.chemin)
+        self.provisoire = False
+
+# Formulaires dont les fichiers sont reçus par FichierTeleverse
+ENVOIS_RAPPORTS = {'rapport_create', 'rapport_edit'}
+
+class RequeteKunda(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in ENVOIS_RAPPORTS:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return self.suivre_fichier(FichierTeleverse.creer(DOSSIER_TELEVERSEMENTS, MAX_FILE_SIZE))
+
+    def suivre_fichier(self, fichier):
+        """Fichier reçu à fermer avec la requête"""
+        self.__dict__.setdefault('fichiers_televerses', []).append(fichier)
+        return fichier
+
+    def close(self):
+        super().close()
+        # Y compris les fichiers d'une lecture interrompue, absents de request.files
+        for fichier in self.__dict__.get('fichiers_televerses', ()):
+            fichier.close()
+
+app.request_class = RequeteKunda
+
+def chemin_televersement(id):
+    return os.path.join(DOSSIER_TELEVERSEMENTS, f'{id}.morceaux')
+
+def etat_televersement(televersement):
+    return {
+        'id': televersement.id,
+        'nom_fichier': televersement.nom_fichier,
+        'taille': televersement.taille,
+        'recu': televersement.recu,
+        'termine': televersement.recu >= televersement.taille
+    }
+
+def televersement_autorise(id):
+    """Envoi par morceaux de l'utilisateur connecté, sinon 404"""
+    televersement = db.get_or_404(TeleversementRapport, id)
+    if televersement.personnel_id != session.get('id'):
+        abort(404)
+    return televersement
+
+def supprimer_televersements(televersements):
+    """Supprime des envois par morceaux (requête) et leurs fichiers"""
+    for (televersement_id,) in televersements.with_entities(TeleversementRapport.id):
+        if os.path.exists(chemin_televersement(televersement_id)):
+            os.remove(chemin_televersement(televersement_id))
+    televersements.delete(synchronize_session=False)
+
+def purger_televersements(personnel_id=None):
+    """Supprime les envois par morceaux abandonnés, et ceux de personnel_id au-delà de
+    MAX_TELEVERSEMENTS_PERSONNEL - 1 pour faire place à un nouvel envoi"""
+    supprimer_televersements(TeleversementRapport.query.filter(
+        TeleversementRapport.date_modification < datetime.utcnow() - TELEVERSEMENT_EXPIRATION
+    ))
+    if personnel_id is not None:
+        anciens = [televersement_id for (televersement_id,) in db.session.query(TeleversementRapport.id).filter(
+            TeleversementRapport.personnel_id == personnel_id
+        ).order_by(TeleversementRapport.date_modification.desc()).offset(MAX_TELEVERSEMENTS_PERSONNEL - 1)]
+        if anciens:
+            supprimer_televersements(TeleversementRapport.query.filter(TeleversementRapport.id.in_(anciens)))
+
+def fichier_rapport_recu():
+    """Fichier d'un formulaire de rapport: (FichierTeleverse, nom d'origine), ou (None, None).
+
+    Un envoi par morceaux terminé (champ televersement) est supprimé avec le commit du rapport.
+    """
+    if request.form.get('televersement'):
+        televersement = televersement_autorise(request.form['televersement'])
+        if televersement.recu < televersement.taille or not os.path.exists(chemin_televersement(televersement.id)):
+            raise ValueError("L'envoi du fichier n'est pas terminé")
+        fichier = request.suivre_fichier(
+            FichierTeleverse.reprendre(chemin_televersement(televersement.id), televersement.taille, MAX_FILE_SIZE)
+        )
+        db.session.delete(televersement)
+        return fichier, televersement.nom_fichier
+    file = request.files.get('fichier')
+    if file is None or file.filename == '':
+        return None, None
+    return file.stream, file.filename
+
+# Stockage des fichiers de rapports par empreinte
+# Un fichier est rangé sous objets/<2 premiers caractères>/<2 suivants>/<SHA-256>: un contenu
+# envoyé plusieurs fois n'est stocké qu'une fois et chaque dossier reste de taille bornée.
+# ObjetRapport.nb_references compte les rapports qui pointent vers le fichier; il est modifié
+# dans la transaction du rapport, et le fichier n'est supprimé qu'au départ de sa dernière
+# référence. Les rapports antérieurs (chemin hors du stockage) sont rangés par
+# `flask rapports-stockage`.
+def chemin_objet_rapport(empreinte):
+    return os.path.join(DOSSIER_OBJETS_RAPPORTS, empreinte[:2], empreinte[2:4], empreinte)
+
+def chemin_objet_rapport_sql(empreinte):
+    """chemin_objet_rapport() calculé en SQL, pour les instructions ensemblistes"""
+    return (
+        db.literal(DOSSIER_OBJETS_RAPPORTS + os.sep, db.String) + func.substr(empreinte, 1, 2) + os.sep
+        + func.substr(empreinte, 3, 2) + os.sep + empreinte
+    )
+
+def stocker_fichier_rapport(fichier):
+    """Range un FichierTeleverse dans le stockage et lui ajoute une référence; retourne son chemin"""
+    table = ObjetRapport.__table__
+    ajout = table.update().where(table.c.empreinte == fichier.empreinte).values(
+        nb_references=table.c.nb_references + 1
+    )
+    # L'UPDATE verrouille la ligne jusqu'au commit: pas de suppression concurrente du fichier
+    if db.session.execute(ajout).rowcount == 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(
+                    empreinte=fichier.empreinte, taille=fichier.taille, nb_references=1
+                ))
+        except IntegrityError:
+            db.session.execute(ajout)
+    chemin = chemin_objet_rapport(fichier.empreinte)
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    # Remplace un éventuel exemplaire identique: le fichier existe quel que soit l'ordre des transactions
+    fichier.conserver(chemin)
+    os.utime(chemin)    # récent, donc ignoré par purger_objets_orphelins jusqu'au commit
+    return chemin
+
+def dereferencer_fichiers_rapports(fichiers):
+    """Retire les références de rapports supprimés ou remplacés, dans la transaction en cours.
+
+    fichiers: couples (chemin_fichier, empreinte_fichier). Retourne ce qu'il faut passer
+    à liberer_fichiers_rapports() après le commit.
+    """
+    fichiers = list(fichiers)
+    stockes = [empreinte for chemin, empreinte in fichiers if empreinte and chemin == chemin_objet_rapport(empreinte)]
+    if stockes:
+        table = ObjetRapport.__table__
+        db.session.execute(
+            table.update().where(table.c.empreinte == db.bindparam('b_empreinte')).values(
+                nb_references=table.c.nb_references - 1
+            ),
+            [{'b_empreinte': empreinte} for empreinte in stockes]
+        )
+    return fichiers
+
+def liberer_fichiers_rapports(fichiers):
+    """Supprime les fichiers qui ne sont plus référencés (à appeler après le commit)"""
+    table = ObjetRapport.__table__
+    for chemin, empreinte in fichiers:
+        if empreinte and chemin == chemin_objet_rapport(empreinte):
+            # Suppression sous le verrou de la ligne: un nouvel envoi du même contenu attend le commit
+            if db.session.execute(table.delete().where(
+                table.c.empreinte == empreinte, table.c.nb_references <= 0
+            )).rowcount and os.path.exists(chemin):
+                os.remove(chemin)
+            db.session.commit()
+        elif os.path.exists(chemin):
+            os.remove(chemin)
+
+# Nombre maximal d'essais de suppression d'un fichier (délai doublé après chaque échec)
+MAX_TENTATIVES_NETTOYAGE = 10
+
+def supprimer_rapports_en_lot(ids):
+    """Supprime des rapports en trois instructions, dans la transaction en cours.
+
+    Les références aux fichiers stockés sont décomptées et les fichiers confiés à la file
+    fichiers_a_supprimer, vidée après le commit par le worker. Retourne le nombre de rapports supprimés.
+    """
+    selection = Rapport.id.in_(ids)
+    objets = ObjetRapport.__table__
+    stockes = db.select(func.count()).where(
+        selection,
+        Rapport.empreinte_fichier == objets.c.empreinte,
+        Rapport.chemin_fichier == chemin_objet_rapport_sql(Rapport.empreinte_fichier)
+    ).scalar_subquery()
+    db.session.execute(
+        objets.update().where(
+            objets.c.empreinte.in_(db.select(Rapport.empreinte_fichier).where(selection))
+        ).values(nb_references=objets.c.nb_references - stockes)
+    )
+    db.session.execute(FichierASupprimer.__table__.insert().from_select(
+        ['chemin', 'empreinte'],
+        db.select(Rapport.chemin_fichier, Rapport.empreinte_fichier).where(selection).distinct()
+    ))
+    return db.session.execute(Rapport.__table__.delete().where(selection)).rowcount
+
+def nettoyer_fichiers(limite=500):
+    """Efface les fichiers de la file dont plus aucun rapport ne dépend; retourne le nombre d'entrées traitées.
+
+    Un échec (fichier verrouillé, disque indisponible) est réessayé plus tard.
+    """
+    entrees = db.session.query(FichierASupprimer.id, FichierASupprimer.chemin, FichierASupprimer.empreinte,
+                               FichierASupprimer.tentatives).filter(
+        FichierASupprimer.prochain_essai <= datetime.utcnow(),
+        FichierASupprimer.tentatives < MAX_TENTATIVES_NETTOYAGE
+    ).order_by(FichierASupprimer.id).limit(limite).all()
+    for entree in entrees:
+        a_traiter = FichierASupprimer.query.filter(FichierASupprimer.id == entree.id)
+        try:
+            liberer_fichiers_rapports([(entree.chemin, entree.empreinte)])
+        except OSError as e:
+            db.session.rollback()
+            a_traiter.update({
+                FichierASupprimer.tentatives: entree.tentatives + 1,
+                FichierASupprimer.prochain_essai: datetime.utcnow() + timedelta(minutes=2 ** entree.tentatives),
+                FichierASupprimer.erreur: str(e)
+            }, synchronize_session=False)
+        else:
+            a_traiter.delete(synchronize_session=False)
+        db.session.commit()
+    return len(entrees)
+
+def ranger_rapports_existants():
+    """Range dans le stockage les fichiers des rapports antérieurs; retourne (rangés, introuvables)"""
+    ranges = introuvables = 0
+    dernier_id = 0
+    while True:
+        rapports = Rapport.query.filter(Rapport.id > dernier_id).order_by(Rapport.id).limit(500).all()
+        if not rapports:
+            return ranges, introuvables
+        dernier_id = rapports[-1].id
+        for rapport in rapports:
+            ancien = rapport.chemin_fichier
+            if rapport.empreinte_fichier and ancien == chemin_objet_rapport(rapport.empreinte_fichier):
+                continue
+            if not os.path.exists(ancien):
+                introuvables += 1
+                continue
+            # Copie (empreinte calculée au passage); l'ancien fichier n'est supprimé qu'après le commit
+            fichier = FichierTeleverse.creer(DOSSIER_TELEVERSEMENTS, float('inf'))
+            with open(ancien, 'rb') as source:
+                shutil.copyfileobj(source, fichier, TAILLE_MORCEAU_TELEVERSEMENT)
+            rapport.chemin_fichier = stocker_fichier_rapport(fichier)
+            rapport.empreinte_fichier = fichier.empreinte
+            rapport.taille_fichier = fichier.taille
+            db.session.commit()
+            os.remove(ancien)
+            ranges += 1
+
+def purger_objets_orphelins(age_min=timedelta(hours=1)):
+    """Supprime les fichiers du stockage sans référence (création annulée), plus anciens que age_min"""
+    limite = chrono.time() - age_min.total_seconds()
+    candidats = []
+    for dossier, _, noms in os.walk(DOSSIER_OBJETS_RAPPORTS):
+        candidats.extend(
+            os.path.join(dossier, nom) for nom in noms if os.path.getmtime(os.path.join(dossier, nom)) < limite
+        )
+    supprimes = 0
+    for lot in range(0, len(candidats), 500):
+        chemins = {os.path.basename(chemin): chemin for chemin in candidats[lot:lot + 500]}
+        references = {empreinte for (empreinte,) in db.session.query(ObjetRapport.empreinte).filter(
+            ObjetRapport.empreinte.in_(chemins), ObjetRapport.nb_references > 0
+        )}
+        for empreinte in chemins.keys() - references:
+            liberer_fichiers_rapports([(chemins[empreinte], empreinte)])
+            if os.path.exists(chemins[empreinte]):
+                os.remove(chemins[empreinte])
+            supprimes += 1
+    return supprimes
+
+@app.route('/rapport/televersements', methods=['POST'])
+@login_required
+def televersement_create():
+    """Ouvre un envoi par morceaux: {nom_fichier, taille} -> état de l'envoi"""
+    donnees = request.get_json(silent=True) or {}
+    nom_fichier = str(donnees.get('nom_fichier', ''))[:255]
+    taille = donnees.get('taille')
+    if not allowed_file(nom_fichier):
+        return jsonify({'error': 'Type de fichier non autorisé. Seuls les fichiers PDF, DOC et DOCX sont acceptés.'}), 400
+    if not isinstance(taille, int) or taille <= 0:
+        return jsonify({'error': 'Taille du fichier invalide'}), 400
+    if taille > MAX_FILE_SIZE:
+        return jsonify({'error': 'Le fichier est trop volumineux (maximum 16MB)'}), 413
+
+    purger_televersements(session['id'])
+    televersement = TeleversementRapport(
+        id=os.urandom(16).hex(), personnel_id=session['id'], nom_fichier=nom_fichier, taille=taille
+    )
+    open(chemin_televersement(televersement.id), 'xb').close()
+    db.session.add(televersement)
+    db.session.commit()
+    reponse = jsonify(etat_televersement(televersement))
+    reponse.status_code = 201
+    reponse.headers['Location'] = url_for('televersement_statut', id=televersement.id)
+    return reponse
+
+@app.route('/rapport/televersements/<id>')
+@login_required
+def televersement_statut(id):
+    """Position à partir de laquelle reprendre l'envoi"""
+    reponse = jsonify(etat_televersement(televersement_autorise(id)))
+    reponse.cache_control.no_store = True
+    return reponse
+
+@app.route('/rapport/televersements/<id>', methods=['PATCH'])
+@login_required
+def televersement_morceau(id):
+    """Écrit le corps de la requête à la position Upload-Offset (au plus la position déjà reçue).
+
+    Un morceau renvoyé après une coupure réécrit les mêmes octets; la partie reçue avant
+    une coupure reste acquise.
+    """
+    televersement = televersement_autorise(id)
+    position = request.headers.get('Upload-Offset', type=int)
+    if position is None or not 0 <= position <= televersement.recu:
+        return jsonify(etat_televersement(televersement)), 409
+
+    fin = position
+    try:
+        with open(chemin_televersement(televersement.id), 'r+b') as fichier:
+            fichier.seek(position)
+            for morceau in iter(lambda: request.stream.read(TAILLE_MORCEAU_TELEVERSEMENT), b''):
+                if fin + len(morceau) > televersement.taille:
+                    raise RequestEntityTooLarge()
+                fichier.write(morceau)
+                fin += len(morceau)
+    finally:
+        # Mise à jour conditionnelle: un envoi concurrent plus avancé n'est pas écrasé
+        TeleversementRapport.query.filter(
+            TeleversementRapport.id == televersement.id, TeleversementRapport.recu < fin
+        ).update({
+            TeleversementRapport.recu: fin, TeleversementRapport.date_modification: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+    db.session.refresh(televersement)
+    return jsonify(etat_televersement(televersement))
+
 @app.route('/rapport/create', methods=['GET', 'POST'])
 @login_required
 def rapport_create():
     if request.method == 'POST':
         try:
-            # Vérification du fichier
-            if 'fichier' not in request.files:
-                flash('Aucun fichier sélectionné', 'error')
-                return render_template('rapport/create.html')
-            
-            file = request.files['fichier']
-            if file.filename == '':
+            # Vérification du fichier (taille limitée pendant la réception)
+            fichier, nom_fichier = fichier_rapport_recu()
+            if fichier is None:
                 flash('Aucun fichier sélectionné', 'error')
                 return render_template('rapport/create.html')
             
-            if not allowed_file(file.filename):
+            if not allowed_file(nom_fichier):
                 flash('Type de fichier non autorisé. Seuls les fichiers PDF, DOC et DOCX sont acceptés.', 'error')
                 return render_template('rapport/create.html')
             
-            # Vérification de la taille du fichier
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-            
-            if file_size > MAX_FILE_SIZE:
-                flash('Le fichier est trop volumineux (maximum 16MB)', 'error')
-                return render_template('rapport/create.html')
-            
-            # Génération d'un nom de fichier sécurisé
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{session['id']}_{timestamp}_{filename}"
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            
-            # Sauvegarde du fichier
-            file.save(file_path)
+            # Rangement du fichier reçu dans le stockage par empreinte
+            file_path = stocker_fichier_rapport(fichier)
             
             # Création de l'enregistrement
             rapport = Rapport(
                 titre=request.form['titre'],
                 description=request.form.get('description'),
-                nom_fichier=file.filename,
+                nom_fichier=nom_fichier,
                 chemin_fichier=file_path,
-                type_fichier=filename.rsplit('.', 1)[1].lower(),
-                taille_fichier=file_size,
+                type_fichier=nom_fichier.rsplit('.', 1)[1].lower(),
+                taille_fichier=fichier.taille,
+                empreinte_fichier=fichier.empreinte,
                 semaine_debut=datetime.strptime(request.form['semaine_debut'], '%Y-%m-%d').date(),
                 semaine_fin=datetime.strptime(request.form['semaine_fin'], '%Y-%m-%d').date(),
                 personnel_id=session['id'],
@@ -1644,11 +3555,13 @@ def rapport_create():
             flash('Rapport ajouté avec succès!', 'success')
             return redirect(url_for('rapport_list'))
             
+        except RequestEntityTooLarge:
+            db.session.rollback()
+            flash('Le fichier est trop volumineux (maximum 16MB)', 'error')
         except Exception as e:
+            # Le fichier éventuellement stocké peut être partagé: une référence annulée est
+            # laissée à purger_objets_orphelins
             db.session.rollback()
-            # Supprimer le fichier en cas d'erreur
-            if 'file_path' in locals() and os.path.exists(file_path):
-                os.remove(file_path)
             flash(f'Erreur lors de l\'ajout du rapport: {str(e)}', 'error')
     
     return render_template('rapport/create.html')
@@ -1664,6 +3577,70 @@ def rapport_detail(id):
     
     return render_template('rapport/detail.html', rapport=rapport)
 
+# Types MIME des fichiers de rapports (le stockage par empreinte n'a pas d'extension)
+TYPES_MIME_RAPPORTS = {
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+# Durée de cache d'un fichier demandé avec son empreinte (?v=): son contenu ne change jamais
+DUREE_CACHE_IMMUABLE = 365 * 24 * 3600
+
+def disposition_piece_jointe(nom):
+    """En-tête Content-Disposition d'un téléchargement (nom non ASCII selon la RFC 5987)"""
+    try:
+        nom.encode('ascii')
+        return 'attachment', {'filename': nom}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', nom).encode('ascii', 'ignore').decode('ascii')
+        return 'attachment', {'filename': simple, 'filename*': f"UTF-8''{quote(nom, safe='!#$&+-.^_`|~')}"}
+
+def reponse_fichier_rapport(rapport):
+    """Téléchargement d'un rapport dont l'accès a été vérifié.
+
+    Un fichier du stockage par empreinte a pour ETag son SHA-256; demandé avec ?v=<empreinte>,
+    il est mis en cache sans limite (immutable), sinon revalidé à chaque fois.
+    Avec RAPPORTS_DOWNLOAD_MODE, l'envoi (Range compris) est confié au serveur frontal.
+    """
+    empreinte = rapport.empreinte_fichier
+    if not (empreinte and rapport.chemin_fichier == chemin_objet_rapport(empreinte)):
+        empreinte = None    # rapport antérieur au stockage par empreinte
+    if empreinte and request.if_none_match.contains(empreinte):
+        reponse = Response(status=304)
+        reponse.set_etag(empreinte)
+    elif app.config['RAPPORTS_DOWNLOAD_MODE'] in ('x-accel', 'x-sendfile'):
+        reponse = Response(mimetype=TYPES_MIME_RAPPORTS.get(rapport.type_fichier, 'application/octet-stream'))
+        disposition, options = disposition_piece_jointe(rapport.nom_fichier)
+        reponse.headers.set('Content-Disposition', disposition, **options)
+        chemin = os.path.abspath(rapport.chemin_fichier)
+        if app.config['RAPPORTS_DOWNLOAD_MODE'] == 'x-accel':
+            relatif = os.path.relpath(chemin, os.path.abspath(UPLOAD_FOLDER)).replace(os.sep, '/')
+            reponse.headers['X-Accel-Redirect'] = app.config['RAPPORTS_ACCEL_PREFIX'].rstrip('/') + '/' + quote(relatif)
+        else:
+            reponse.headers['X-Sendfile'] = chemin
+        if empreinte:
+            reponse.set_etag(empreinte)
+    else:
+        reponse = send_file(
+            os.path.abspath(rapport.chemin_fichier),
+            as_attachment=True,
+            download_name=rapport.nom_fichier,
+            mimetype=TYPES_MIME_RAPPORTS.get(rapport.type_fichier),
+            etag=empreinte or True,
+            max_age=0
+        )
+
+    if empreinte and request.args.get('v') == empreinte:
+        reponse.cache_control.max_age = DUREE_CACHE_IMMUABLE
+        reponse.cache_control.immutable = True
+        reponse.cache_control.no_cache = False
+    else:
+        reponse.cache_control.max_age = 0
+        reponse.cache_control.no_cache = True
+    reponse.cache_control.public = False
+    reponse.cache_control.private = True
+    return reponse
+
 @app.route('/rapport/<int:id>/download')
 @login_required
 def rapport_download(id):
@@ -1677,70 +3654,159 @@ def rapport_download(id):
         flash('Fichier introuvable', 'error')
         return redirect(url_for('rapport_detail', id=id))
     
-    return send_file(
-        rapport.chemin_fichier,
-        as_attachment=True,
-        download_name=rapport.nom_fichier
-    )
+    return reponse_fichier_rapport(rapport)
 
 @app.route('/rapport/bulk-action', methods=['POST'])
 @login_required
 def rapport_bulk_action():
-    """Actions en lot sur plusieurs rapports"""
+    """Actions en lot sur plusieurs rapports (une instruction SQL par action)"""
     if session['role'] != 'Administrator':
         return jsonify({'error': 'Accès non autorisé'}), 403
     
     action = request.json.get('action')
-    rapport_ids = request.json.get('rapports', [])
+    try:
+        rapport_ids = sorted({int(i) for i in request.json.get('rapports', [])})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Identifiants de rapports invalides'}), 400
     
     if not rapport_ids:
         return jsonify({'error': 'Aucun rapport sélectionné'}), 400
+    if action not in ('delete', 'validate', 'reject'):
+        return jsonify({'error': f'Action inconnue: {action}'}), 400
     
     try:
-        rapports = Rapport.query.filter(Rapport.id.in_(rapport_ids)).all()
+        selection = Rapport.query.filter(Rapport.id.in_(rapport_ids))
         
         if action == 'delete':
-            for rapport in rapports:
-                # Supprimer le fichier physique
-                if os.path.exists(rapport.chemin_fichier):
-                    os.remove(rapport.chemin_fichier)
-                
-                log_activity(
-                    action='SUPPRESSION_BULK_RAPPORT',
-                    description=f"Suppression en lot du rapport ID: {rapport.id}"
-                )
-                
-                db.session.delete(rapport)
+            # Les fichiers sont effacés par le worker, après le commit
+            nb_rapports = supprimer_rapports_en_lot(rapport_ids)
+            journal = ('SUPPRESSION_BULK_RAPPORT', 'Suppression')
         
         elif action == 'validate':
-            for rapport in rapports:
-                rapport.statut = 'validé'
-                rapport.date_modification = datetime.now(timezone.utc)
-                
-                log_activity(
-                    action='VALIDATION_BULK_RAPPORT',
-                    description=f"Validation en lot du rapport ID: {rapport.id}"
-                )
+            nb_rapports = selection.update({
+                Rapport.statut: 'validé',
+                Rapport.date_modification: datetime.now(timezone.utc)
+            }, synchronize_session=False)
+            journal = ('VALIDATION_BULK_RAPPORT', 'Validation')
         
-        elif action == 'reject':
-            observations = request.json.get('observations', 'Rejeté en lot')
-            for rapport in rapports:
-                rapport.statut = 'rejeté'
-                rapport.observations = observations
-                rapport.date_modification = datetime.now(timezone.utc)
-                
-                log_activity(
-                    action='REJET_BULK_RAPPORT',
-                    description=f"Rejet en lot du rapport ID: {rapport.id}"
-                )
+        else:
+            nb_rapports = selection.update({
+                Rapport.statut: 'rejeté',
+                Rapport.observations: request.json.get('observations', 'Rejeté en lot'),
+                Rapport.date_modification: datetime.now(timezone.utc)
+            }, synchronize_session=False)
+            journal = ('REJET_BULK_RAPPORT', 'Rejet')
+        
+        # Une seule entrée de journal pour le lot
+        log_activity(
+            action=journal[0],
+            description=f"{journal[1]} en lot de {nb_rapports} rapport(s) - ID: {', '.join(map(str, rapport_ids))}"
+        )
         
         db.session.commit()
-        return jsonify({'success': True, 'message': f'Action "{action}" appliquée à {len(rapports)} rapport(s)'})
+        return jsonify({'success': True, 'message': f'Action "{action}" appliquée à {nb_rapports} rapport(s)'})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Taille des morceaux lus dans chaque fichier ajouté à une archive de rapports
+TAILLE_MORCEAU_ARCHIVE = 256 * 1024
+
+def selection_rapports(ids=None, debut=None, fin=None):
+    """Rapports visibles par l'utilisateur connecté, d'une liste d'identifiants et/ou
+    dont la semaine chevauche la période [debut, fin]"""
+    query = db.session.query(
+        Rapport.nom_fichier, Rapport.chemin_fichier, Rapport.date_modification, Personnel.nom, Personnel.prenom
+    ).join(Personnel, Rapport.personnel_id == Personnel.id)
+    if session['role'] != 'Administrator':
+        query = query.filter(Rapport.personnel_id == session['id'])
+    if ids:
+        query = query.filter(Rapport.id.in_(ids))
+    if debut:
+        query = query.filter(Rapport.semaine_fin >= debut)
+    if fin:
+        query = query.filter(Rapport.semaine_debut <= fin)
+    return query.order_by(Rapport.semaine_debut, Personnel.nom, Rapport.id)
+
+def nom_dans_archive(rapport, deja_pris):
+    """« Nom Prénom - nom_fichier », numéroté en cas de doublon"""
+    nom = f"{rapport.nom} {rapport.prenom or ''}".strip() + ' - ' + rapport.nom_fichier
+    nom = nom.replace('/', '_').replace('\\', '_')
+    base, extension = os.path.splitext(nom)
+    numero = 2
+    while nom in deja_pris:
+        nom = f"{base} ({numero}){extension}"
+        numero += 1
+    deja_pris.add(nom)
+    return nom
+
+def generer_zip_rapports(rapports):
+    """Archive ZIP des fichiers de rapports, envoyée au fil de la lecture des fichiers.
+
+    Chaque fichier est copié par morceaux: la mémoire utilisée ne dépend pas de la taille
+    de l'archive. Les fichiers introuvables sont listés dans manquants.txt.
+    """
+    tampon = TamponFlux()
+    noms = set()
+    manquants = []
+    # PDF et DOCX sont déjà compressés: stockés tels quels dans l'archive
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_STORED) as archive:
+        for rapport in rapports:
+            nom = nom_dans_archive(rapport, noms)
+            try:
+                source = open(rapport.chemin_fichier, 'rb')
+            except FileNotFoundError:
+                manquants.append(nom)
+                continue
+            with source:
+                info = zipfile.ZipInfo(nom, date_time=(rapport.date_modification or datetime.now()).timetuple()[:6])
+                info.file_size = os.fstat(source.fileno()).st_size
+                with archive.open(info, 'w') as destination:
+                    for morceau in iter(lambda: source.read(TAILLE_MORCEAU_ARCHIVE), b''):
+                        destination.write(morceau)
+                        yield tampon.vider()
+            yield tampon.vider()
+
+        if manquants:
+            archive.writestr('manquants.txt', 'Fichiers introuvables:\n' + '\n'.join(manquants) + '\n')
+    yield tampon.vider()
+
+@app.route('/rapports/archive.zip')
+@login_required
+def rapport_archive():
+    """Fichiers des rapports choisis (ids=1,2,... et/ou semaine_debut, semaine_fin au format AAAA-MM-JJ) dans un ZIP"""
+    try:
+        ids = [int(i) for valeur in request.args.getlist('ids') for i in valeur.split(',') if i.strip()]
+        debut, fin = (
+            datetime.strptime(request.args[nom], '%Y-%m-%d').date() if request.args.get(nom) else None
+            for nom in ('semaine_debut', 'semaine_fin')
+        )
+    except ValueError:
+        abort(400)
+    if not (ids or debut or fin):
+        flash('Choisissez des rapports ou une période.', 'error')
+        return redirect(url_for('rapport_list'))
+
+    rapports = selection_rapports(ids, debut, fin).all()
+    if not rapports:
+        flash('Aucun rapport pour cette sélection.', 'warning')
+        return redirect(url_for('rapport_list'))
+
+    # Enregistrement dans le journal
+    log_activity(
+        action='TELECHARGEMENT_RAPPORTS',
+        description=f"Téléchargement de {len(rapports)} rapport(s) en archive ZIP"
+    )
+    db.session.commit()
+
+    nom_fichier = f"rapports_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+    return Response(
+        stream_with_context(generer_zip_rapports(rapports)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{nom_fichier}"'}
+    )
+
 @app.route('/rapport/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def rapport_edit(id):
@@ -1752,7 +3818,10 @@ def rapport_edit(id):
     
     if request.method == 'POST':
         try:
-            old_file_path = rapport.chemin_fichier
+            ancien_fichier = (rapport.chemin_fichier, rapport.empreinte_fichier)
+            liberes = []
+            # Vérification s'il y a un nouveau fichier (taille limitée pendant la réception)
+            fichier, nom_fichier = fichier_rapport_recu()
             
             # Mise à jour des informations de base
             rapport.titre = request.form['titre']
@@ -1766,39 +3835,21 @@ def rapport_edit(id):
             if session['role'] == 'Administrator':
                 rapport.statut = request.form.get('statut', rapport.statut)
             
-            # Vérification s'il y a un nouveau fichier
-            if 'fichier' in request.files and request.files['fichier'].filename != '':
-                file = request.files['fichier']
-                
-                if not allowed_file(file.filename):
+            if fichier is not None:
+                if not allowed_file(nom_fichier):
                     flash('Type de fichier non autorisé.', 'error')
                     return render_template('rapport/edit.html', rapport=rapport)
                 
-                # Vérification de la taille
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-                
-                if file_size > MAX_FILE_SIZE:
-                    flash('Le fichier est trop volumineux (maximum 16MB)', 'error')
-                    return render_template('rapport/edit.html', rapport=rapport)
-                
-                # Suppression de l'ancien fichier
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-                
-                # Sauvegarde du nouveau fichier
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{session['id']}_{timestamp}_{filename}"
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(file_path)
+                # Remplacement du fichier: l'ancien est supprimé après le commit s'il n'est plus utilisé
+                file_path = stocker_fichier_rapport(fichier)
+                liberes = dereferencer_fichiers_rapports([ancien_fichier])
                 
                 # Mise à jour des informations du fichier
-                rapport.nom_fichier = file.filename
+                rapport.nom_fichier = nom_fichier
                 rapport.chemin_fichier = file_path
-                rapport.type_fichier = filename.rsplit('.', 1)[1].lower()
-                rapport.taille_fichier = file_size
+                rapport.type_fichier = nom_fichier.rsplit('.', 1)[1].lower()
+                rapport.taille_fichier = fichier.taille
+                rapport.empreinte_fichier = fichier.empreinte
             
             # Enregistrement dans le journal
             log_activity(
@@ -1807,9 +3858,13 @@ def rapport_edit(id):
             )
             
             db.session.commit()
+            liberer_fichiers_rapports(liberes)
             flash('Rapport mis à jour avec succès!', 'success')
             return redirect(url_for('rapport_detail', id=id))
             
+        except RequestEntityTooLarge:
+            db.session.rollback()
+            flash('Le fichier est trop volumineux (maximum 16MB)', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Erreur lors de la mise à jour: {str(e)}', 'error')
@@ -1827,9 +3882,8 @@ def rapport_delete(id):
         return render_template('not_access.html')
     
     try:
-        # Suppression du fichier physique
-        if os.path.exists(rapport.chemin_fichier):
-            os.remove(rapport.chemin_fichier)
+        # Le fichier n'est supprimé qu'avec sa dernière référence, après le commit
+        liberes = dereferencer_fichiers_rapports([(rapport.chemin_fichier, rapport.empreinte_fichier)])
         
         # Enregistrement dans le journal
         log_activity(
@@ -1839,6 +3893,7 @@ def rapport_delete(id):
         
         db.session.delete(rapport)
         db.session.commit()
+        liberer_fichiers_rapports(liberes)
         flash('Rapport supprimé avec succès!', 'success')
         
     except Exception as e:
@@ -1851,11 +3906,13 @@ def rapport_delete(id):
 @login_required
 @role_required('Administrator', 'Trading', 'Academy', 'Digital')
 def proces_verbal_list():
-    page = request.args.get('page', 1, type=int)
+    curseur = request.args.get('curseur', '', type=str)
     search = request.args.get('search', '', type=str)
     statut = request.args.get('statut', '', type=str)
     
-    query = ProcesVerbal.query.join(Personnel, ProcesVerbal.created_by == Personnel.id)
+    query = ProcesVerbal.query.join(Personnel, ProcesVerbal.created_by == Personnel.id).options(
+        *PROFILS_CHARGEMENT['proces_verbal_list']
+    )
     
     if search:
         query = query.filter(
@@ -1869,9 +3926,7 @@ def proces_verbal_list():
     if statut:
         query = query.filter(ProcesVerbal.statut == statut)
     
-    proces_verbaux = query.order_by(ProcesVerbal.date_reunion.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    proces_verbaux = paginer_par_curseur(query, curseur=curseur, cle_tri=ProcesVerbal.date_reunion, descendant=True)
     
     return render_template('proces_verbal/list.html', 
                          proces_verbaux=proces_verbaux, 
@@ -2065,12 +4120,39 @@ def personnel_search():
     
     return jsonify(results)
 
-@app.route('/factures')
-@login_required
-@role_required('Comptabilite', 'Trading', 'Academy', 'Digital', 'Administrator')
-def facture_list():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '', type=str)
+# Numérotation des factures: FACT-AAAAMMJJ-NNNN, NNNN venant d'un compteur par jour (CompteurFacture).
+# Le compteur est incrémenté dans la transaction qui crée la facture: sa ligne reste verrouillée
+# jusqu'au commit, deux créations simultanées reçoivent des numéros distincts et un rollback
+# rend le numéro (pas de trou). Un numéro n'est jamais réattribué après suppression d'une facture.
+FORMAT_NUMERO_FACTURE = 'FACT-{periode}-{rang:04d}'
+
+def allouer_numero_facture(jour=None):
+    """Réserve le numéro de facture suivant du jour dans la transaction en cours"""
+    periode = (jour or datetime.now()).strftime('%Y%m%d')
+    table = CompteurFacture.__table__
+    dialecte = db.engine.dialect.name
+    if dialecte == 'postgresql' or (dialecte == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35)):
+        # Une seule instruction: INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+        insert = insert_postgresql if dialecte == 'postgresql' else insert_sqlite
+        requete = insert(table).values(periode=periode, dernier_numero=1).on_conflict_do_update(
+            index_elements=[table.c.periode], set_={'dernier_numero': table.c.dernier_numero + 1}
+        ).returning(table.c.dernier_numero)
+        rang = db.session.execute(requete).scalar_one()
+    else:
+        # L'UPDATE verrouille la ligne jusqu'au commit; la relecture voit donc notre incrément
+        maj = table.update().where(table.c.periode == periode).values(dernier_numero=table.c.dernier_numero + 1)
+        if db.session.execute(maj).rowcount == 0:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.insert().values(periode=periode, dernier_numero=1))
+            except IntegrityError:
+                # Compteur du jour créé entre-temps par une autre transaction
+                db.session.execute(maj)
+        rang = db.session.execute(db.select(table.c.dernier_numero).where(table.c.periode == periode)).scalar_one()
+    return FORMAT_NUMERO_FACTURE.format(periode=periode, rang=rang)
+
+def requete_factures(search=''):
+    """Factures filtrées par la recherche de la liste (partagée avec l'export)"""
     query = Facture.query
     if search:
         query = query.filter(
@@ -2080,9 +4162,15 @@ def facture_list():
             (Facture.designation.contains(search)) |
             (Facture.numero_facture.contains(search))
         )
-    factures = query.order_by(Facture.date_facture.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    return query
+
+@app.route('/factures')
+@login_required
+@role_required('Comptabilite', 'Trading', 'Academy', 'Digital', 'Administrator')
+def facture_list():
+    curseur = request.args.get('curseur', '', type=str)
+    search = request.args.get('search', '', type=str)
+    factures = paginer_par_curseur(requete_factures(search), curseur=curseur, cle_tri=Facture.date_facture, descendant=True)
     return render_template('factures/list.html', factures=factures, search=search, min=min)
 
 @app.route('/factures/create', methods=['GET', 'POST'])
@@ -2092,8 +4180,7 @@ def facture_create():
     if request.method == 'POST':
         try:
             # Générer un numéro de facture unique
-            now = datetime.now()
-            numero_facture = f"FACT-{now.strftime('%Y%m%d')}-{Facture.query.count() + 1:04d}"
+            numero_facture = allouer_numero_facture()
             
             facture = Facture(
                 numero_facture=numero_facture,
@@ -2163,6 +4250,7 @@ def facture_edit(id):
             )
 
             db.session.commit()
+            cache_pdf_factures.invalider(id)
             flash('Facture mise à jour avec succès!', 'success')
             return redirect(url_for('facture_detail', id=id))
         except Exception as e:
@@ -2183,85 +4271,1095 @@ def facture_delete(id):
         )
         db.session.delete(facture)
         db.session.commit()
+        cache_pdf_factures.invalider(id)
         flash('Facture supprimée avec succès!', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erreur lors de la suppression de la facture: {str(e)}', 'error')
     return redirect(url_for('facture_list'))
 
+# PDF des factures
+MODELE_PDF_FACTURE = 'factures/pdf_template.html'
+# Images intégrées au PDF et leur largeur d'affichage dans le template (px CSS, 1 px = 1/96 pouce)
+IMAGES_PDF_FACTURE = {'logoSLCblanc.jpg': 130, 'signature.jpg': 130}
+RESOLUTION_IMAGES_PDF = 300    # points par pouce à l'impression
+QUALITE_JPEG_PDF = 85
+
+def _memoire_residente(champ):
+    """VmRSS / VmHWM du processus en octets (None hors Linux)"""
+    try:
+        with open('/proc/self/status') as statut:
+            for ligne in statut:
+                if ligne.startswith(champ + ':'):
+                    return int(ligne.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _reinitialiser_pic_memoire():
+    """Ramène VmHWM à la mémoire résidente actuelle (Linux, /proc/self/clear_refs)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fichier:
+            fichier.write('5')
+    except OSError:
+        pass
+
+@dataclass
+class RenduPdf:
+    """PDF généré en mémoire et mesures du rendu"""
+    contenu: bytes
+    duree_ms: float
+    memoire_avant: int    # mémoire résidente du processus avant le rendu (octets, None hors Linux)
+    pic_memoire: int    # pic de mémoire résidente pendant le rendu (octets, None hors Linux)
+
+    @property
+    def surcout_memoire(self):
+        if self.pic_memoire is None or self.memoire_avant is None:
+            return None
+        return max(self.pic_memoire - self.memoire_avant, 0)
+
+    def server_timing(self):
+        description = f'pic {self.pic_memoire / 1048576:.1f} Mo' if self.pic_memoire is not None else 'rendu'
+        return f'pdf;dur={self.duree_ms:.1f};desc="{description}"'
+
+def variante_image_pdf(chemin, largeur_css):
+    """Image réduite à sa taille d'impression et recompressée en JPEG: (type MIME, octets).
+
+    Une image déjà assez petite est gardée telle quelle si c'est un JPEG.
+    """
+    largeur = round(largeur_css * RESOLUTION_IMAGES_PDF / 96)
+    with Image.open(chemin) as image:
+        if image.width <= largeur and image.format == 'JPEG':
+            with open(chemin, 'rb') as fichier:
+                return 'image/jpeg', fichier.read()
+        hauteur = max(round(image.height * largeur / image.width), 1)
+        image.draft('RGB', (largeur, hauteur))    # décodage JPEG directement à échelle réduite
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            fond = Image.new('RGB', image.size, 'white')
+            fond.paste(image, mask=image.getchannel('A'))
+            image = fond
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.width > largeur:
+            image = image.resize((largeur, hauteur), Image.Resampling.LANCZOS)
+        sortie = io.BytesIO()
+        image.save(sortie, 'JPEG', quality=QUALITE_JPEG_PDF, optimize=True)
+    return 'image/jpeg', sortie.getvalue()
+
+class RenduPdfFactures:
+    """Rendu des factures en PDF, entièrement en mémoire.
+
+    Les images intégrées (logo, signature) sont réduites à leur taille d'impression
+    (variante_image_pdf) et encodées en base64 une seule fois, puis rechargées
+    seulement quand leur fichier change (taille ou date de modification).
+    Le PDF est écrit dans un BytesIO, sans fichier temporaire.
+    Chaque rendu mesure sa durée et le pic de mémoire résidente du processus;
+    ce pic est global au processus et inclut donc les rendus concurrents.
+    """
+
+    def __init__(self, dossier_images, images):
+        self.dossier_images = dossier_images
+        self.images = images    # {nom: largeur d'affichage en px CSS}
+        self._images = {}    # {nom: (signature du fichier, data URI ou None)}
+        self._verrou = threading.Lock()
+        self.signatures()
+
+    def _image(self, nom):
+        chemin = os.path.join(self.dossier_images, nom)
+        try:
+            etat = os.stat(chemin)
+            signature = (etat.st_size, etat.st_mtime_ns)
+        except FileNotFoundError:
+            signature = None
+        entree = self._images.get(nom)
+        if entree is None or entree[0] != signature:
+            with self._verrou:
+                data_uri = None
+                if signature is not None:
+                    type_mime, donnees = variante_image_pdf(chemin, self.images[nom])
+                    data_uri = f"data:{type_mime};base64,{base64.b64encode(donnees).decode('ascii')}"
+                entree = self._images[nom] = (signature, data_uri)
+        return entree
+
+    def signatures(self):
+        """Signature (taille, date de modification, largeur d'impression) de chaque image, rechargée si elle a changé"""
+        return tuple(
+            (nom, self._image(nom)[0], largeur, RESOLUTION_IMAGES_PDF, QUALITE_JPEG_PDF)
+            for nom, largeur in self.images.items()
+        )
+
+    def rendre(self, facture):
+        """PDF de la facture (RenduPdf), ou None si xhtml2pdf signale une erreur"""
+        html_content = render_template(
+            MODELE_PDF_FACTURE,
+            facture=facture,
+            datetime=datetime,
+            logo_base64=self._image('logoSLCblanc.jpg')[1],
+            signature_base64=self._image('signature.jpg')[1]
+        )
+        _reinitialiser_pic_memoire()
+        memoire_avant = _memoire_residente('VmRSS')
+        debut = chrono.perf_counter()
+        tampon = io.BytesIO()
+        pisa_status = pisa.CreatePDF(html_content, dest=tampon)
+        duree_ms = (chrono.perf_counter() - debut) * 1000
+        if pisa_status.err:
+            return None
+        rendu = RenduPdf(tampon.getvalue(), duree_ms, memoire_avant, _memoire_residente('VmHWM'))
+        app.logger.info(
+            "PDF facture %s: %.0f ms, %d octets, pic mémoire %s",
+            facture.numero_facture, rendu.duree_ms, len(rendu.contenu),
+            f"{rendu.pic_memoire / 1048576:.1f} Mo (+{rendu.surcout_memoire / 1048576:.1f} Mo)"
+            if rendu.pic_memoire is not None else "non mesuré"
+        )
+        return rendu
+
+rendu_pdf_factures = RenduPdfFactures(os.path.join(app.static_folder, 'img'), IMAGES_PDF_FACTURE)
+
+class CachePdfFactures:
+    """PDF de factures déjà générés, stockés sur disque sous le nom <id>-<empreinte>.pdf.
+
+    L'empreinte couvre les champs de la facture et la version du template: une facture
+    modifiée ou un template changé produit un nouveau fichier. Les fichiers d'une facture
+    sont supprimés à sa modification ou à sa suppression. Au-delà de `taille_max` octets,
+    les fichiers les moins récemment servis sont évincés (la date de modification est
+    rafraîchie à chaque lecture).
+    """
+
+    def __init__(self, dossier, taille_max):
+        self.dossier = dossier
+        self.taille_max = taille_max
+
+    def chemin(self, facture_id, empreinte):
+        return os.path.join(self.dossier, f'{facture_id}-{empreinte}.pdf')
+
+    @property
+    def actif(self):
+        return self.taille_max > 0
+
+    def lire(self, facture_id, empreinte):
+        """Chemin du PDF en cache, ou None"""
+        if not self.actif:
+            return None
+        chemin = self.chemin(facture_id, empreinte)
+        try:
+            os.utime(chemin)
+        except FileNotFoundError:
+            return None
+        return chemin
+
+    def enregistrer(self, facture_id, empreinte, contenu):
+        if not self.actif:
+            return None
+        os.makedirs(self.dossier, exist_ok=True)
+        chemin = self.chemin(facture_id, empreinte)
+        provisoire = f'{chemin}.{os.getpid()}.{threading.get_ident()}'
+        with open(provisoire, 'wb') as fichier:
+            fichier.write(contenu)
+        os.replace(provisoire, chemin)  # atomique: un autre worker ne lit jamais un PDF incomplet
+        self._evincer()
+        return chemin
+
+    def invalider(self, facture_id):
+        for chemin in glob.glob(os.path.join(self.dossier, f'{facture_id}-*.pdf')):
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+
+    def _evincer(self):
+        fichiers = []
+        for entree in os.scandir(self.dossier):
+            if entree.name.endswith('.pdf'):
+                try:
+                    etat = entree.stat()
+                except FileNotFoundError:
+                    continue
+                fichiers.append((etat.st_mtime, etat.st_size, entree.path))
+        taille = sum(taille for _, taille, _ in fichiers)
+        for _, taille_fichier, chemin in sorted(fichiers):
+            if taille <= self.taille_max:
+                break
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+            taille -= taille_fichier
+
+cache_pdf_factures = CachePdfFactures(
+    app.config['FACTURES_PDF_CACHE_DIR'],
+    app.config['FACTURES_PDF_CACHE_SIZE']
+)
+
+def version_modele_facture():
+    """Empreinte du template PDF et des images qu'il intègre"""
+    source = app.jinja_env.loader.get_source(app.jinja_env, MODELE_PDF_FACTURE)[0]
+    version = hashlib.sha256(source.encode('utf-8'))
+    version.update(repr(rendu_pdf_factures.signatures()).encode())
+    return version.hexdigest()
+
+def champs_facture(facture):
+    return {colonne.key: getattr(facture, colonne.key) for colonne in Facture.__table__.columns}
+
+def empreinte_pdf_facture(facture, version=None):
+    """Clé de cache (et ETag) du PDF: champs de la facture et version du template"""
+    contenu = json.dumps([champs_facture(facture), version or version_modele_facture()], sort_keys=True, default=str)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+def obtenir_pdf_facture(facture, empreinte, personnel_id=None):
+    """(chemin du PDF en cache, None) ou (None, RenduPdf) après rendu; (None, None) si le rendu échoue"""
+    chemin = cache_pdf_factures.lire(facture.id, empreinte)
+    if chemin is not None:
+        return chemin, None
+    rendu = rendu_pdf_factures.rendre(facture)
+    if rendu is None:
+        return None, None
+    # Enregistrement dans le journal
+    log_activity(
+        action='GENERATION_PDF_FACTURE',
+        description=f"Génération PDF de la facture {facture.numero_facture}",
+        personnel_id=personnel_id
+    )
+    cache_pdf_factures.enregistrer(facture.id, empreinte, rendu.contenu)
+    return None, rendu
+
 @app.route('/factures/<int:id>/pdf')
 @login_required
 @role_required('Comptabilite', 'Trading', 'Academy', 'Digital', 'Administrator')
 def facture_pdf(id):
     facture = Facture.query.get_or_404(id)
-    
-    # Fonction pour convertir l'image en base64
-    def get_logo_base64(image):
-        try:
-            # Chemin vers le logo dans le dossier static
-            logo_path = os.path.join(current_app.static_folder, 'img', image)
-            
-            # Vérifier si le fichier existe
-            if os.path.exists(logo_path):
-                with open(logo_path, 'rb') as img_file:
-                    img_data = img_file.read()
-                    # Encoder en base64
-                    img_base64 = base64.b64encode(img_data).decode('utf-8')
-                    
-                    # Déterminer le type MIME basé sur l'extension
-                    if logo_path.lower().endswith('.png'):
-                        mime_type = 'image/png'
-                    elif logo_path.lower().endswith(('.jpg', '.jpeg')):
-                        mime_type = 'image/jpeg'
-                    elif logo_path.lower().endswith('.gif'):
-                        mime_type = 'image/gif'
-                    else:
-                        mime_type = 'image/png'  # Par défaut
-                    
-                    return f"data:{mime_type};base64,{img_base64}"
-            else:
-                # Retourner None si le logo n'existe pas
-                return None
-        except Exception as e:
-            print(f"Erreur lors du chargement du logo: {e}")
-            return None
-    
-    # Obtenir le logo en base64
-    logo_base64 = get_logo_base64('logoSLCblanc.jpg')
-    signature_base64 = get_logo_base64('signature.jpg')
-    
-    # Rendu du template HTML de la facture
-    html_content = render_template(
-        'factures/pdf_template.html', 
-        facture=facture, 
-        datetime=datetime,
-        logo_base64=logo_base64,
-        signature_base64=signature_base64
+    empreinte = empreinte_pdf_facture(facture)
+    if request.if_none_match.contains(empreinte):
+        reponse = Response(status=304)
+        reponse.set_etag(empreinte)
+        return reponse
+
+    if request.args.get('differe') == '1':
+        return reponse_tache(soumettre_tache('facture_pdf', {'id': id}))
+
+    chemin, rendu = obtenir_pdf_facture(facture, empreinte)
+    if chemin is None and rendu is None:
+        flash('Erreur lors de la génération du PDF', 'error')
+        return redirect(url_for('facture_detail', id=id))
+
+    reponse = send_file(
+        io.BytesIO(rendu.contenu) if rendu else os.path.abspath(chemin),
+        as_attachment=True,
+        download_name=f"facture_{facture.numero_facture}.pdf",
+        mimetype='application/pdf',
+        etag=empreinte,
+        max_age=0
     )
-    
-    # Création d'un fichier temporaire
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-        # Conversion HTML vers PDF
-        pisa_status = pisa.CreatePDF(html_content, dest=tmp_file)
-        
-        if pisa_status.err:
-            flash('Erreur lors de la génération du PDF', 'error')
-            return redirect(url_for('facture_detail', id=id))
-        
-        tmp_file.seek(0)
-        
-        # Enregistrement dans le journal
-        log_activity(
-            action='GENERATION_PDF_FACTURE',
-            description=f"Génération PDF de la facture {facture.numero_facture}"
+    reponse.cache_control.private = True
+    if rendu:
+        reponse.headers['Server-Timing'] = rendu.server_timing()
+    return reponse
+
+# EXPORTS
+# Nombre de lignes lues par lot (curseur côté serveur sous PostgreSQL)
+TAILLE_LOT_EXPORT = 5000
+
+class TamponFlux(io.RawIOBase):
+    """Fichier en écriture seule dont le contenu est récupéré par morceaux.
+
+    Permet d'écrire une archive (zipfile) au fil d'un générateur de réponse,
+    sans la constituer sur disque ni en mémoire.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, donnees):
+        self._morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def vider(self):
+        donnees = b''.join(self._morceaux)
+        self._morceaux.clear()
+        return donnees
+
+def generer_csv(entetes, lots):
+    """CSV (séparateur ';', décimales ',', UTF-8 avec BOM pour Excel), un morceau par lot"""
+    yield '\ufeff'.encode('utf-8') + (';'.join(entetes) + '\r\n').encode('utf-8')
+    for lot in lots:
+        cadre = pd.DataFrame.from_records(lot, columns=entetes)
+        yield cadre.to_csv(sep=';', decimal=',', index=False, header=False, lineterminator='\r\n').encode('utf-8')
+
+_CARACTERES_INTERDITS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_ORIGINE_EXCEL = datetime(1899, 12, 30)
+
+def _cellule_xlsx(valeur):
+    if valeur is None:
+        return '<c/>'
+    if isinstance(valeur, bool):
+        return f'<c t="b"><v>{int(valeur)}</v></c>'
+    if isinstance(valeur, datetime):
+        return f'<c s="2"><v>{(valeur.replace(tzinfo=None) - _ORIGINE_EXCEL).total_seconds() / 86400}</v></c>'
+    if hasattr(valeur, 'isoformat') and not isinstance(valeur, time):
+        return f'<c s="1"><v>{(valeur - _ORIGINE_EXCEL.date()).days}</v></c>'
+    if isinstance(valeur, (int, float, Decimal)):
+        return f'<c><v>{valeur}</v></c>'
+    texte = _CARACTERES_INTERDITS_XML.sub('', str(valeur))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(texte)}</t></is></c>'
+
+_FICHIERS_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Styles: 0 = standard, 1 = date (jj/mm/aaaa), 2 = date et heure
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+        '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+def generer_xlsx(entetes, lots):
+    """Classeur XLSX d'une feuille, produit au fil des lots (ZIP en flux, chaînes en ligne)"""
+    tampon = TamponFlux()
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom, contenu in _FICHIERS_XLSX.items():
+            archive.writestr(nom, contenu)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as feuille:
+            feuille.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                '<row>' + ''.join(_cellule_xlsx(e) for e in entetes) + '</row>'
+            ).encode('utf-8'))
+            for lot in lots:
+                feuille.write(''.join(
+                    '<row>' + ''.join(_cellule_xlsx(v) for v in ligne) + '</row>' for ligne in lot
+                ).encode('utf-8'))
+                yield tampon.vider()
+            feuille.write(b'</sheetData></worksheet>')
+    yield tampon.vider()
+
+# Registres exportables: rôles autorisés et requête filtrée comme la page de liste
+EXPORTS = {
+    'trading': (('Trading',), lambda search: rechercher_operations(Trading, search)[0]),
+    'academy': (('Academy',), lambda search: rechercher_operations(Academy, search)[0]),
+    'digital': (('Digital',), lambda search: rechercher_operations(Digital, search)[0]),
+    'finance': (('Comptabilite',), requete_finances),
+    'materiel': (('Comptabilite',), requete_materiels),
+    'facture': (('Comptabilite', 'Trading', 'Academy', 'Digital', 'Administrator'), requete_factures),
+}
+
+FORMATS_EXPORT = {
+    'csv': (generer_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (generer_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+@app.route('/export/<entite>.<format_export>')
+@login_required
+def export_registre(entite, format_export):
+    """Export complet d'un registre, lu par lots et envoyé au fil de l'eau"""
+    if entite not in EXPORTS or format_export not in FORMATS_EXPORT:
+        abort(404)
+    roles = EXPORTS[entite][0]
+    if session.get('role') not in roles and session.get('role') != 'Administrator':
+        return render_template('not_access.html')
+
+    search = request.args.get('search', '', type=str)
+    if request.args.get('differe') == '1':
+        return reponse_tache(soumettre_tache('export', {'entite': entite, 'format': format_export, 'search': search}))
+
+    morceaux, type_contenu, nom_fichier = flux_export(entite, format_export, search)
+    return Response(
+        stream_with_context(morceaux),
+        mimetype=type_contenu,
+        headers={'Content-Disposition': f'attachment; filename="{nom_fichier}"'}
+    )
+
+def flux_export(entite, format_export, search=''):
+    """(morceaux, type MIME, nom de fichier) de l'export complet d'un registre"""
+    query = EXPORTS[entite][1](search)
+    modele = query.column_descriptions[0]['entity']
+    colonnes = [c for c in modele.__table__.columns if c.key != 'recherche']
+    instruction = query.with_entities(*colonnes).order_by(modele.id).statement.execution_options(
+        yield_per=TAILLE_LOT_EXPORT
+    )
+
+    def lots():
+        for lot in db.session.execute(instruction).partitions():
+            yield lot
+
+    generateur, type_contenu = FORMATS_EXPORT[format_export]
+    nom_fichier = f"{entite}_{datetime.now().strftime('%Y%m%d_%H%M')}.{format_export}"
+    return generateur([c.key for c in colonnes], lots()), type_contenu, nom_fichier
+
+# PDF DES FACTURES PAR LOTS
+# xhtml2pdf est limité par le GIL: les PDF absents du cache sont rendus dans des processus
+# séparés, chacun recevant les champs de la facture (sans accès à la base).
+def _initialiser_processus_pdf():
+    app.app_context().push()    # render_template dans le processus de rendu
+
+def _rendre_facture_processus(champs):
+    rendu = rendu_pdf_factures.rendre(SimpleNamespace(**champs))
+    return rendu.contenu if rendu else None
+
+# Groupe de processus de rendu, créé au premier lot et partagé par les requêtes du processus.
+# Les processus sont lancés par forkserver (ou spawn), jamais par fork d'un processus
+# qui fait déjà tourner des threads (requêtes, écrivain du journal, pool de connexions).
+_executeur_pdf = {'pid': None, 'executeur': None}
+_verrou_executeur_pdf = threading.Lock()
+
+def executeur_pdf(nb_processus):
+    """Groupe de processus de rendu du processus courant (nb_processus à la création)"""
+    with _verrou_executeur_pdf:
+        if _executeur_pdf['pid'] != os.getpid() or _executeur_pdf['executeur'] is None:
+            methodes = multiprocessing.get_all_start_methods()
+            contexte = multiprocessing.get_context('forkserver' if 'forkserver' in methodes else 'spawn')
+            _executeur_pdf.update(pid=os.getpid(), executeur=ProcessPoolExecutor(
+                max_workers=nb_processus, mp_context=contexte, initializer=_initialiser_processus_pdf
+            ))
+        return _executeur_pdf['executeur']
+
+def abandonner_executeur_pdf(executeur):
+    """Un processus de rendu est mort: le groupe sera recréé au prochain lot"""
+    with _verrou_executeur_pdf:
+        if _executeur_pdf['executeur'] is executeur:
+            _executeur_pdf['executeur'] = None
+    executeur.shutdown(wait=False, cancel_futures=True)
+
+def _rendus_factures(a_rendre, nb_processus):
+    """(champs, empreinte, contenu PDF ou None) dans l'ordre de fin des rendus.
+
+    Au plus deux tâches par processus sont soumises d'avance, ce qui borne le
+    nombre de PDF terminés en attente d'envoi.
+    """
+    if nb_processus <= 1 or not a_rendre:
+        for champs, empreinte in a_rendre:
+            yield champs, empreinte, _rendre_facture_processus(champs)
+        return
+
+    executeur = executeur_pdf(nb_processus)
+    file_attente, en_cours = iter(a_rendre), {}
+    try:
+        while True:
+            for champs, empreinte in islice(file_attente, 2 * nb_processus - len(en_cours)):
+                en_cours[executeur.submit(_rendre_facture_processus, champs)] = (champs, empreinte)
+            if not en_cours:
+                break
+            termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for tache in termines:
+                champs, empreinte = en_cours.pop(tache)
+                yield champs, empreinte, tache.result()
+    except BrokenProcessPool:
+        abandonner_executeur_pdf(executeur)
+        raise
+    finally:
+        # Client déconnecté ou erreur: les rendus de ce lot pas encore commencés sont abandonnés
+        for tache in en_cours:
+            tache.cancel()
+
+def generer_zip_factures(factures, nb_processus):
+    """Archive ZIP des PDF de factures [(champs, empreinte)], envoyée au fil des rendus.
+
+    Les PDF en cache sont ajoutés d'abord; les autres sont rendus en parallèle, mis en
+    cache et ajoutés dès qu'ils sont prêts. Les factures en échec sont listées dans erreurs.txt.
+    """
+    tampon = TamponFlux()
+    erreurs = []
+    # Les PDF sont déjà compressés: stockés tels quels dans l'archive
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_STORED) as archive:
+        a_rendre = []
+        for champs, empreinte in factures:
+            chemin = cache_pdf_factures.lire(champs['id'], empreinte)
+            try:
+                if chemin is None:
+                    raise FileNotFoundError
+                archive.write(chemin, f"facture_{champs['numero_facture']}.pdf")
+            except FileNotFoundError:    # absent, ou évincé entre-temps
+                a_rendre.append((champs, empreinte))
+                continue
+            yield tampon.vider()
+
+        for champs, empreinte, contenu in _rendus_factures(a_rendre, nb_processus):
+            if contenu is None:
+                erreurs.append(champs['numero_facture'])
+                continue
+            cache_pdf_factures.enregistrer(champs['id'], empreinte, contenu)
+            archive.writestr(f"facture_{champs['numero_facture']}.pdf", contenu)
+            yield tampon.vider()
+
+        if erreurs:
+            archive.writestr('erreurs.txt', 'PDF non générés:\n' + '\n'.join(erreurs) + '\n')
+    yield tampon.vider()
+
+def selection_factures(ids=None, debut=None, fin=None):
+    """Factures d'une liste d'identifiants et/ou d'une période (dates incluses), par date"""
+    query = Facture.query
+    if ids:
+        query = query.filter(Facture.id.in_(ids))
+    if debut:
+        query = query.filter(Facture.date_facture >= debut)
+    if fin:
+        query = query.filter(Facture.date_facture < fin + timedelta(days=1))
+    return query.order_by(Facture.date_facture, Facture.id)
+
+def lot_pdf_factures(factures):
+    """[(champs, empreinte)] des factures, prêts pour generer_zip_factures"""
+    version = version_modele_facture()
+    return [(champs_facture(facture), empreinte_pdf_facture(facture, version)) for facture in factures]
+
+@app.route('/factures/pdf.zip')
+@login_required
+@role_required('Comptabilite', 'Trading', 'Academy', 'Digital', 'Administrator')
+def facture_pdf_lot():
+    """PDF des factures choisies (ids=1,2,... et/ou debut, fin au format AAAA-MM-JJ) dans un ZIP"""
+    try:
+        ids = [int(i) for valeur in request.args.getlist('ids') for i in valeur.split(',') if i.strip()]
+        debut, fin = (
+            datetime.strptime(request.args[nom], '%Y-%m-%d') if request.args.get(nom) else None
+            for nom in ('debut', 'fin')
         )
-        
-        return send_file(
-            tmp_file.name,
-            as_attachment=True,
-            download_name=f"facture_{facture.numero_facture}.pdf",
-            mimetype='application/pdf'
+    except ValueError:
+        abort(400)
+    if not (ids or debut or fin):
+        flash('Choisissez des factures ou une période.', 'error')
+        return redirect(url_for('facture_list'))
+
+    if request.args.get('differe') == '1':
+        return reponse_tache(soumettre_tache('factures_pdf', {
+            'ids': ids, 'debut': debut and debut.date().isoformat(), 'fin': fin and fin.date().isoformat()
+        }))
+
+    factures = lot_pdf_factures(selection_factures(ids, debut, fin))
+    if not factures:
+        flash('Aucune facture pour cette sélection.', 'warning')
+        return redirect(url_for('facture_list'))
+
+    # Enregistrement dans le journal
+    log_activity(
+        action='GENERATION_PDF_FACTURES',
+        description=f"Génération PDF de {len(factures)} facture(s) en archive ZIP"
+    )
+    db.session.commit()
+
+    nom_fichier = f"factures_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+    return Response(
+        stream_with_context(generer_zip_factures(factures, app.config['FACTURES_PDF_WORKERS'])),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{nom_fichier}"'}
+    )
+
+# IMPORTS
+TAILLE_LOT_IMPORT = 5000
+EXTENSIONS_IMPORT = {'csv', 'xlsx'}
+TYPES_PAIEMENT = ('Virement bancaire', 'Cheque', 'Especes', 'Paiement mobile')
+# Colonnes reconnues dans un fichier d'opérations (en-têtes identiques à l'export)
+COLONNES_IMPORT = ('date_const', 'type_libelle', 'nom_client', 'prenom_client', 'phone_client', 'email_client',
+                   'items', 'quantite', 'prix_unit', 'montant_ht', 'tva', 'montant_ttc',
+                   'modalite_paiement', 'type_paiement', 'observations')
+COLONNES_NUMERIQUES_IMPORT = ('quantite', 'prix_unit', 'montant_ht', 'tva', 'montant_ttc')
+COLONNES_TEXTE_IMPORT = ('type_libelle', 'nom_client', 'prenom_client', 'phone_client', 'email_client',
+                         'items', 'modalite_paiement')
+# Écart toléré entre un montant fourni et le montant recalculé
+TOLERANCE_MONTANT = 0.01
+MAX_ERREURS_AFFICHEES = 500
+
+@dataclass
+class BilanImport:
+    """Résultat d'un import: lignes lues, lignes importées et erreurs par ligne du fichier"""
+    nb_lignes: int = 0
+    nb_importees: int = 0
+    erreurs: list = field(default_factory=list)    # [(numéro de ligne, [messages])]
+    simulation: bool = False
+
+    @property
+    def nb_rejetees(self):
+        return len(self.erreurs)
+
+def lire_lots_import(fichier, extension, taille_lot=TAILLE_LOT_IMPORT):
+    """Lit un fichier CSV (';' ou ',') ou XLSX par lots de DataFrames, en-têtes normalisés.
+
+    Chaque lot est indexé par le numéro de la ligne du fichier où commence l'enregistrement
+    (lignes vides comprises, un champ CSV entre guillemets pouvant couvrir plusieurs lignes).
+    """
+    def entete(nom):
+        return normaliser_recherche(str(nom or '')).replace(' ', '_')
+
+    if extension == 'xlsx':
+        import openpyxl
+        classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+        try:
+            lignes = classeur.active.iter_rows(values_only=True)
+            entetes = [entete(nom) for nom in next(lignes, ())]
+            numero = 2    # la ligne 1 contient les en-têtes
+            while True:
+                lot = [ligne[:len(entetes)] for ligne in islice(lignes, taille_lot)]
+                if not lot:
+                    break
+                yield pd.DataFrame.from_records(lot, columns=entetes, index=pd.RangeIndex(numero, numero + len(lot)))
+                numero += len(lot)
+        finally:
+            classeur.close()
+    else:
+        texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+        premiere_ligne = texte.readline()
+        separateur = ';' if premiere_ligne.count(';') >= premiere_ligne.count(',') else ','
+        entetes = [entete(nom) for nom in next(csv.reader([premiere_ligne], delimiter=separateur), [])]
+        lecteur = csv.reader(texte, delimiter=separateur)
+        complement = [''] * len(entetes)
+        while True:
+            numeros, lot = [], []
+            for _ in range(taille_lot):
+                numero = lecteur.line_num + 2    # line_num compte les lignes lues après les en-têtes
+                ligne = next(lecteur, None)
+                if ligne is None:
+                    break
+                numeros.append(numero)
+                lot.append((ligne + complement)[:len(entetes)])
+            if not lot:
+                break
+            yield pd.DataFrame.from_records(lot, columns=entetes, index=numeros)
+
+def valider_lot_import(lot):
+    """Valide et convertit un lot de lignes (indexé par numéro de ligne), par colonnes entières.
+
+    Retourne (lignes valides converties, erreurs [(numéro de ligne, [messages])]).
+    Les lignes entièrement vides sont ignorées.
+    """
+    index = lot.index
+    textes = pd.DataFrame({
+        colonne: (lot[colonne].fillna('').astype(str).str.strip().to_numpy()
+                  if colonne in lot.columns else '')
+        for colonne in COLONNES_IMPORT
+    }, index=index)
+    controles = []    # [(masque des lignes en erreur, message)]
+    donnees = pd.DataFrame(index=index)
+
+    # Dates: ISO (export, Excel) ou jj/mm/aaaa
+    texte = textes['date_const']
+    dates = pd.to_datetime(texte.where(texte != ''), errors='coerce', format='ISO8601')
+    a_relire = dates.isna() & (texte != '')
+    dates[a_relire] = pd.to_datetime(texte[a_relire], errors='coerce', format='%d/%m/%Y')
+    controles.append((dates.isna() & (texte != ''), "date_const: date invalide (AAAA-MM-JJ ou JJ/MM/AAAA)"))
+    donnees['date_const'] = dates
+
+    for colonne in COLONNES_NUMERIQUES_IMPORT:
+        texte = textes[colonne].str.replace(r'[\s\u00a0\u202f]', '', regex=True).str.replace(',', '.', regex=False)
+        valeurs = pd.to_numeric(texte.where(texte != ''), errors='coerce')
+        controles.append((valeurs.isna() & (texte != ''), f"{colonne}: nombre invalide"))
+        donnees[colonne] = valeurs
+    controles.append((donnees['quantite'].notna() & (donnees['quantite'] % 1 != 0), "quantite: nombre entier attendu"))
+
+    for colonne in COLONNES_TEXTE_IMPORT:
+        controles.append((textes[colonne].str.len() > 255, f"{colonne}: 255 caractères au maximum"))
+        donnees[colonne] = textes[colonne].where(textes[colonne] != '')
+    donnees['observations'] = textes['observations'].where(textes['observations'] != '')
+
+    types = {normaliser_recherche(t): t for t in TYPES_PAIEMENT}
+    texte = textes['type_paiement']
+    donnees['type_paiement'] = texte.map(normaliser_recherche).map(types).where(texte != '', 'Especes')
+    controles.append((donnees['type_paiement'].isna(), "type_paiement: valeur attendue parmi " + ', '.join(TYPES_PAIEMENT)))
+
+    # Cohérence des montants: HT = quantité × prix unitaire, TTC = HT + TVA (taux en %)
+    ht_calcule = donnees['quantite'] * donnees['prix_unit']
+    controles.append(((donnees['montant_ht'] - ht_calcule).abs() > TOLERANCE_MONTANT + 1e-9,
+                      "montant_ht: différent de quantite × prix_unit"))
+    ht = donnees['montant_ht'].fillna(ht_calcule)
+    ttc_calcule = (ht * (1 + donnees['tva'].fillna(0) / 100)).round(2)
+    controles.append(((donnees['montant_ttc'] - ttc_calcule).abs() > TOLERANCE_MONTANT + 1e-9,
+                      "montant_ttc: différent de montant_ht + TVA"))
+    donnees['montant_ht'] = ht.round(2)
+    donnees['montant_ttc'] = donnees['montant_ttc'].fillna(ttc_calcule)
+
+    vides = (textes == '').all(axis=1)
+    en_erreur = pd.Series(False, index=index)
+    for masque, _ in controles:
+        en_erreur |= masque
+    en_erreur &= ~vides
+
+    erreurs = {}
+    for masque, message in controles:
+        for ligne in masque[masque & ~vides].index:
+            erreurs.setdefault(ligne, []).append(message)
+    valides = donnees[~en_erreur & ~vides]
+    return valides.assign(quantite=valides['quantite'].astype('Int64')), sorted(erreurs.items())
+
+def importer_operations(departement, fichier, nom_fichier, personnel_id, simulation=False,
+                        taille_lot=TAILLE_LOT_IMPORT):
+    """Importe un fichier d'opérations (Trading, Academy ou Digital) par lots.
+
+    Les lignes invalides sont rejetées individuellement et rapportées dans le bilan;
+    les autres sont insérées (INSERT multi-lignes par lot) dans une seule transaction,
+    avec la mise à jour du cumul des revenus et une entrée de journal pour l'import.
+    """
+    modele = MODELES_REVENUS[departement]
+    extension = nom_fichier.rsplit('.', 1)[-1].lower()
+    bilan = BilanImport(simulation=simulation)
+    cumul = {}    # {jour: [montant TTC, nombre d'opérations]}
+
+    try:
+        for lot in lire_lots_import(fichier, extension, taille_lot):
+            if not set(COLONNES_IMPORT) & set(lot.columns):
+                raise ValueError("Aucune colonne reconnue. En-têtes attendus: " + ', '.join(COLONNES_IMPORT))
+            valides, erreurs = valider_lot_import(lot)
+            bilan.nb_lignes += len(valides) + len(erreurs)
+            bilan.erreurs.extend(erreurs)
+            if simulation or valides.empty:
+                bilan.nb_importees += len(valides)
+                continue
+
+            for jour, (montant, nb) in valides.groupby('date_const', dropna=False)['montant_ttc'].agg(['sum', 'size']).iterrows():
+                jour = None if pd.isna(jour) else jour.date()
+                cumul.setdefault(jour, [0, 0])
+                cumul[jour][0] += montant
+                cumul[jour][1] += nb
+
+            valides = valides.assign(date_const=valides['date_const'].dt.date)
+            lignes = valides.astype(object).where(valides.notna(), None).to_dict('records')
+            for ligne in lignes:
+                ligne['personnel_id'] = personnel_id
+                ligne['recherche'] = texte_recherche(SimpleNamespace(**ligne))
+            db.session.execute(modele.__table__.insert(), lignes)
+            bilan.nb_importees += len(lignes)
+
+        if simulation or not bilan.nb_importees:
+            db.session.rollback()
+            return bilan
+
+        for jour, (montant, nb) in cumul.items():
+            maj_revenu_journalier(departement, jour, float(montant), int(nb))
+        log_activity(
+            action=f'IMPORT_{departement.upper()}',
+            description=f"Import de {bilan.nb_importees} opération(s) {departement} depuis {nom_fichier} "
+                        f"({bilan.nb_rejetees} ligne(s) rejetée(s))",
+            personnel_id=personnel_id
         )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return bilan
+
+@app.route('/import/<entite>', methods=['GET', 'POST'])
+@login_required
+def import_operations(entite):
+    departement = {d.lower(): d for d in MODELES_REVENUS}.get(entite)
+    if departement is None:
+        abort(404)
+    if session.get('role') not in (departement, 'Administrator'):
+        return render_template('not_access.html')
+
+    bilan = None
+    if request.method == 'POST':
+        fichier = request.files.get('fichier')
+        if not fichier or not fichier.filename:
+            flash('Veuillez sélectionner un fichier.', 'error')
+        elif fichier.filename.rsplit('.', 1)[-1].lower() not in EXTENSIONS_IMPORT:
+            flash('Format de fichier non autorisé. Utilisez CSV ou XLSX.', 'error')
+        else:
+            try:
+                bilan = importer_operations(
+                    departement, fichier.stream, fichier.filename, session.get('id'),
+                    simulation=bool(request.form.get('simulation'))
+                )
+                if bilan.simulation:
+                    flash(f'Vérification terminée: {bilan.nb_importees} ligne(s) valide(s), '
+                          f'{bilan.nb_rejetees} ligne(s) en erreur.', 'info')
+                else:
+                    flash(f'{bilan.nb_importees} opération(s) importée(s), '
+                          f'{bilan.nb_rejetees} ligne(s) rejetée(s).', 'success' if not bilan.erreurs else 'warning')
+            except Exception as e:
+                flash(f"Erreur lors de l'import: {str(e)}", 'error')
+    return render_template('import.html', entite=entite, departement=departement, bilan=bilan,
+                           colonnes=COLONNES_IMPORT, max_erreurs=MAX_ERREURS_AFFICHEES)
+
+# TÂCHES DE FOND
+# Les travaux longs sont enregistrés dans la table taches et exécutés par un processus séparé
+# (flask jobs-worker); le client suit l'avancement par /jobs/<id> et télécharge le résultat.
+MAX_TENTATIVES_TACHE = 3
+# Le worker signale qu'il est vivant à cet intervalle (secondes) pendant l'exécution d'une tâche;
+# sans signe de vie depuis TACHE_ABANDONNEE_APRES, la tâche est remise en file
+INTERVALLE_BATTEMENT_TACHE = 30
+TACHE_ABANDONNEE_APRES = timedelta(minutes=5)
+
+def tache_facture_pdf(parametres, fichier, personnel_id):
+    facture = db.session.get(Facture, parametres['id'])
+    if facture is None:
+        raise ValueError(f"Facture {parametres['id']} introuvable")
+    chemin, rendu = obtenir_pdf_facture(facture, empreinte_pdf_facture(facture), personnel_id)
+    if chemin is None and rendu is None:
+        raise RuntimeError('Erreur lors de la génération du PDF')
+    if rendu is not None:
+        fichier.write(rendu.contenu)
+    else:
+        with open(chemin, 'rb') as source:
+            shutil.copyfileobj(source, fichier)
+    return f"facture_{facture.numero_facture}.pdf", 'application/pdf'
+
+def tache_factures_pdf(parametres, fichier, personnel_id):
+    debut, fin = (
+        datetime.strptime(parametres[nom], '%Y-%m-%d') if parametres.get(nom) else None
+        for nom in ('debut', 'fin')
+    )
+    factures = lot_pdf_factures(selection_factures(parametres.get('ids'), debut, fin))
+    for morceau in generer_zip_factures(factures, app.config['FACTURES_PDF_WORKERS']):
+        fichier.write(morceau)
+    # Enregistrement dans le journal
+    log_activity(
+        action='GENERATION_PDF_FACTURES',
+        description=f"Génération PDF de {len(factures)} facture(s) en archive ZIP",
+        personnel_id=personnel_id
+    )
+    return f"factures_{datetime.now().strftime('%Y%m%d_%H%M')}.zip", 'application/zip'
+
+def tache_export(parametres, fichier, personnel_id):
+    morceaux, type_contenu, nom_fichier = flux_export(parametres['entite'], parametres['format'], parametres.get('search', ''))
+    for morceau in morceaux:
+        fichier.write(morceau)
+    return nom_fichier, type_contenu
+
+# Types de tâches: fonction(parametres, fichier de résultat, personnel_id) -> (nom du fichier, type MIME)
+TACHES = {
+    'facture_pdf': tache_facture_pdf,
+    'factures_pdf': tache_factures_pdf,
+    'export': tache_export,
+}
+
+def soumettre_tache(type_tache, parametres, personnel_id=None):
+    """Enregistre une tâche en attente pour le worker et la retourne"""
+    tache = Tache(
+        type=type_tache,
+        parametres=json.dumps(parametres),
+        personnel_id=personnel_id if personnel_id is not None else session.get('id')
+    )
+    db.session.add(tache)
+    db.session.commit()
+    return tache
+
+def etat_tache(tache):
+    etat = {
+        'id': tache.id,
+        'type': tache.type,
+        'statut': tache.statut,
+        'date_creation': tache.date_creation.isoformat() if tache.date_creation else None,
+        'date_debut': tache.date_debut.isoformat() if tache.date_debut else None,
+        'date_fin': tache.date_fin.isoformat() if tache.date_fin else None,
+        'erreur': tache.erreur,
+    }
+    if tache.statut == 'terminée':
+        etat.update(nom_fichier=tache.nom_fichier, taille=tache.taille,
+                    resultat=url_for('tache_resultat', id=tache.id))
+    return etat
+
+def reponse_tache(tache):
+    """202 Accepted: la tâche est en file, son état se consulte à l'URL de Location"""
+    reponse = jsonify(etat_tache(tache))
+    reponse.status_code = 202
+    reponse.headers['Location'] = url_for('tache_statut', id=tache.id)
+    return reponse
+
+def chemin_resultat_tache(tache_id):
+    return os.path.join(app.config['JOBS_RESULTS_DIR'], str(tache_id))
+
+def reserver_tache(processus):
+    """Passe la plus ancienne tâche en attente à 'en cours' pour ce worker; None si la file est vide.
+
+    Le passage est conditionné au statut 'en attente': si un autre worker a pris la
+    tâche entre-temps, aucune ligne n'est modifiée et la suivante est essayée.
+    """
+    while True:
+        tache_id = db.session.query(Tache.id).filter(Tache.statut == 'en attente').order_by(Tache.id).limit(1).scalar()
+        if tache_id is None:
+            db.session.rollback()
+            return None
+        prise = Tache.query.filter(Tache.id == tache_id, Tache.statut == 'en attente').update({
+            Tache.statut: 'en cours',
+            Tache.processus: processus,
+            Tache.date_debut: datetime.utcnow(),
+            Tache.date_battement: datetime.utcnow(),
+            Tache.tentatives: Tache.tentatives + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if prise:
+            return db.session.get(Tache, tache_id)
+
+def tentative_en_cours(tache_id, tentative):
+    """Filtre de la tâche tant qu'elle appartient à cette tentative (ni remise en file, ni abandonnée)"""
+    return Tache.query.filter(Tache.id == tache_id, Tache.tentatives == tentative, Tache.statut == 'en cours')
+
+def battre_tache(tache_id, tentative, arret):
+    """Thread du worker: met à jour date_battement jusqu'à la fin de la tâche"""
+    while not arret.wait(INTERVALLE_BATTEMENT_TACHE):
+        try:
+            with app.app_context():
+                tentative_en_cours(tache_id, tentative).update(
+                    {Tache.date_battement: datetime.utcnow()}, synchronize_session=False
+                )
+                db.session.commit()
+        except Exception:
+            app.logger.exception("Signe de vie de la tâche %s non enregistré", tache_id)
+
+def executer_tache(tache):
+    """Exécute une tâche réservée et enregistre son résultat (fichier) ou son erreur.
+
+    Le résultat n'est enregistré que si la tâche appartient toujours à cette tentative:
+    une tâche remise en file entre-temps est reprise par un autre worker.
+    """
+    os.makedirs(app.config['JOBS_RESULTS_DIR'], exist_ok=True)
+    tache_id, tentative = tache.id, tache.tentatives
+    chemin = chemin_resultat_tache(tache_id)
+    provisoire = f'{chemin}.{tentative}.partiel'  # propre à la tentative
+
+    arret = threading.Event()
+    battement = threading.Thread(target=battre_tache, args=(tache_id, tentative, arret), name='battement-tache', daemon=True)
+    battement.start()
+    try:
+        with open(provisoire, 'wb') as fichier:
+            nom_fichier, type_mime = TACHES[tache.type](json.loads(tache.parametres), fichier, tache.personnel_id)
+        resultat = {Tache.statut: 'terminée', Tache.nom_fichier: nom_fichier, Tache.type_mime: type_mime,
+                    Tache.taille: os.path.getsize(provisoire)}
+    except Exception as e:
+        db.session.rollback()
+        resultat = {Tache.statut: 'échec', Tache.erreur: f'{type(e).__name__}: {e}'}
+    finally:
+        arret.set()
+        battement.join()
+
+    resultat[Tache.date_fin] = datetime.utcnow()
+    if tentative_en_cours(tache_id, tentative).update(resultat, synchronize_session=False):
+        # La ligne reste verrouillée jusqu'au commit: aucun autre worker ne peut publier en même temps
+        if resultat[Tache.statut] == 'terminée':
+            os.replace(provisoire, chemin)
+        db.session.commit()
+    else:
+        db.session.rollback()
+    if os.path.exists(provisoire):
+        os.remove(provisoire)
+
+def entretenir_taches():
+    """Remet en file les tâches d'un worker arrêté, termine celles qui dépassent la durée maximale
+    et purge les résultats expirés"""
+    maintenant = datetime.utcnow()
+    abandonnees = Tache.query.filter(
+        Tache.statut == 'en cours',
+        func.coalesce(Tache.date_battement, Tache.date_debut) < maintenant - TACHE_ABANDONNEE_APRES
+    )
+    abandonnees.filter(Tache.tentatives < MAX_TENTATIVES_TACHE).update(
+        {Tache.statut: 'en attente', Tache.processus: None}, synchronize_session=False
+    )
+    abandonnees.update(
+        {Tache.statut: 'échec', Tache.erreur: 'Worker arrêté pendant la tâche', Tache.date_fin: maintenant},
+        synchronize_session=False
+    )
+    # Worker vivant mais tâche trop longue: son résultat ne sera pas enregistré (voir executer_tache)
+    Tache.query.filter(
+        Tache.statut == 'en cours',
+        Tache.date_debut < maintenant - timedelta(minutes=app.config['JOBS_TIMEOUT_MINUTES'])
+    ).update(
+        {Tache.statut: 'échec', Tache.erreur: 'Durée maximale dépassée', Tache.date_fin: maintenant},
+        synchronize_session=False
+    )
+    expirees = Tache.query.filter(
+        Tache.statut.in_(('terminée', 'échec')),
+        Tache.date_fin < maintenant - timedelta(hours=app.config['JOBS_RETENTION_HOURS'])
+    )
+    for (tache_id,) in expirees.with_entities(Tache.id):
+        chemin = chemin_resultat_tache(tache_id)
+        # Résultat et fichiers partiels laissés par les tentatives d'un worker arrêté
+        for fichier in [chemin, *glob.glob(f'{glob.escape(chemin)}.*.partiel')]:
+            if os.path.exists(fichier):
+                os.remove(fichier)
+    expirees.delete(synchronize_session=False)
+    db.session.commit()
+
+def travailler(intervalle, une_fois=False):
+    """Boucle du worker: exécute les tâches en attente une à une, puis attend les suivantes"""
+    processus = f'{os.uname().nodename}:{os.getpid()}'
+    prochain_entretien = prochaine_purge = 0
+    while True:
+        if chrono.monotonic() >= prochain_entretien:
+            entretenir_taches()
+            prochain_entretien = chrono.monotonic() + 60
+        tache = reserver_tache(processus)
+        if tache is not None:
+            executer_tache(tache)
+        elif nettoyer_fichiers():
+            # Fichiers des rapports supprimés en lot, traités quand la file des tâches est vide
+            continue
+        elif chrono.monotonic() >= prochaine_purge:
+            # Fichiers stockés par une création ou modification de rapport annulée
+            purger_objets_orphelins()
+            db.session.commit()
+            prochaine_purge = chrono.monotonic() + 3600
+        elif une_fois:
+            return
+        else:
+            chrono.sleep(intervalle)
+
+def tache_autorisee(id):
+    """Tâche de l'utilisateur connecté (ou toute tâche pour un administrateur), sinon 404"""
+    tache = db.get_or_404(Tache, id)
+    if tache.personnel_id != session.get('id') and session.get('role') != 'Administrator':
+        abort(404)
+    return tache
+
+@app.route('/jobs/<int:id>')
+@login_required
+def tache_statut(id):
+    reponse = jsonify(etat_tache(tache_autorisee(id)))
+    reponse.cache_control.no_store = True
+    return reponse
+
+@app.route('/jobs/<int:id>/resultat')
+@login_required
+def tache_resultat(id):
+    tache = tache_autorisee(id)
+    chemin = chemin_resultat_tache(tache.id)
+    if tache.statut != 'terminée' or not os.path.exists(chemin):
+        abort(404)
+    reponse = send_file(
+        os.path.abspath(chemin),
+        as_attachment=True,
+        download_name=tache.nom_fichier,
+        mimetype=tache.type_mime
+    )
+    reponse.cache_control.private = True
+    return reponse
 
 # Route de connexion
 @app.route('/login', methods=['GET', 'POST'])
@@ -2292,6 +5390,7 @@ def login():
                 user_agent=request.headers.get('User-Agent', '')[:500]
             )
             db.session.add(activity)
+            marquer_donnees_modifiees()
             db.session.commit()
             
             flash(f'Connexion réussie! Bienvenue {personnel.username}', 'success')
@@ -2315,6 +5414,7 @@ def logout():
             user_agent=request.headers.get('User-Agent', '')[:500]
         )
         db.session.add(activity)
+        marquer_donnees_modifiees()
         db.session.commit()
 
     session.clear()
@@ -2325,15 +5425,116 @@ def logout():
 @app.route('/api/dashboard-data')
 @login_required
 def dashboard_data():
-    dept_stats = db.session.query(
-        Personnel.departement,
-        func.count(Personnel.id)
-    ).group_by(Personnel.departement).all()
+    stats = statistiques_dashboard_en_cache()
     
     return jsonify({
-        'departements': [{'name': dept, 'count': count} for dept, count in dept_stats]
+        'departements': [{'name': dept, 'count': count} for dept, count in stats.dept_stats],
+        'revenus': [
+            {'departement': dept, 'montant': montant, 'montant_mois': stats.revenus_mois_par_dept[dept]}
+            for dept, montant in stats.revenus_par_dept.items()
+        ]
     })
 
+# Commandes CLI
+@app.cli.command('rebuild-revenus')
+def rebuild_revenus_command():
+    """Recalcule le cumul journalier des revenus à partir des ventes"""
+    nb_lignes = rebuild_revenus_journaliers()
+    click.echo(f"Cumul des revenus recalculé: {nb_lignes} ligne(s)")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Applique les migrations de schéma en attente"""
+    db.create_all()
+    appliquees = appliquer_migrations()
+    for version, description in appliquees:
+        click.echo(f"Migration {version} appliquée: {description}")
+    if not appliquees:
+        click.echo("Schéma à jour")
+
+@app.cli.command('rapports-stockage')
+def rapports_stockage_command():
+    """Range les fichiers des rapports antérieurs dans le stockage par empreinte et purge les orphelins"""
+    ranges, introuvables = ranger_rapports_existants()
+    supprimes = purger_objets_orphelins()
+    click.echo(f"{ranges} fichier(s) rangé(s), {introuvables} introuvable(s), {supprimes} orphelin(s) supprimé(s)")
+
+@app.cli.command('check-index')
+def check_index_command():
+    """Vérifie par EXPLAIN que les requêtes fréquentes utilisent un index"""
+    resultats = verifier_plans_requetes()
+    for nom, (ok, detail) in resultats.items():
+        click.echo(f"[{'OK' if ok else 'SCAN'}] {nom}: {detail}")
+    if not all(ok for ok, _ in resultats.values()):
+        sys.exit(1)
+
+@app.cli.command('import-operations')
+@click.argument('departement', type=click.Choice(list(MODELES_REVENUS)))
+@click.argument('chemin', type=click.Path(exists=True, dir_okay=False))
+@click.option('--username', required=True, help="Personnel à qui les opérations sont attribuées")
+@click.option('--simulation', is_flag=True, help="Valide le fichier sans rien enregistrer")
+def import_operations_command(departement, chemin, username, simulation):
+    """Importe un fichier CSV ou XLSX d'opérations Trading, Academy ou Digital"""
+    personnel = Personnel.query.filter_by(username=username).first()
+    if personnel is None:
+        raise click.BadParameter(f"personnel inconnu: {username}", param_hint='--username')
+    debut = chrono.perf_counter()
+    with open(chemin, 'rb') as fichier:
+        bilan = importer_operations(departement, fichier, os.path.basename(chemin), personnel.id, simulation=simulation)
+    for ligne, messages in bilan.erreurs:
+        click.echo(f"Ligne {ligne}: {'; '.join(messages)}", err=True)
+    click.echo(f"{'Lignes valides' if simulation else 'Opérations importées'}: {bilan.nb_importees}, "
+               f"lignes rejetées: {bilan.nb_rejetees} ({chrono.perf_counter() - debut:.1f} s)")
+
+@app.cli.command('factures-pdf')
+@click.argument('sortie', type=click.Path(dir_okay=False, writable=True))
+@click.option('--debut', type=click.DateTime(formats=['%Y-%m-%d']), help="Première date de facture (incluse)")
+@click.option('--fin', type=click.DateTime(formats=['%Y-%m-%d']), help="Dernière date de facture (incluse)")
+@click.option('--ids', help="Identifiants de factures séparés par des virgules")
+@click.option('--processus', type=int, default=app.config['FACTURES_PDF_WORKERS'], show_default=True,
+              help="Nombre de processus de rendu")
+def factures_pdf_command(sortie, debut, fin, ids, processus):
+    """Écrit les PDF des factures choisies dans une archive ZIP"""
+    try:
+        ids = [int(i) for i in ids.split(',') if i.strip()] if ids else None
+    except ValueError:
+        raise click.BadParameter("liste d'entiers attendue", param_hint='--ids')
+    if not (ids or debut or fin):
+        raise click.UsageError("indiquez --ids et/ou --debut/--fin")
+    factures = lot_pdf_factures(selection_factures(ids, debut, fin))
+    debut_rendu = chrono.perf_counter()
+    with open(sortie, 'wb') as fichier:
+        for morceau in generer_zip_factures(factures, processus):
+            fichier.write(morceau)
+    duree = chrono.perf_counter() - debut_rendu
+    click.echo(f"{len(factures)} facture(s) écrites dans {sortie} en {duree:.1f} s "
+               f"({len(factures) / duree if duree else 0:.1f} PDF/s, {processus} processus)")
+
+@app.cli.command('jobs-worker')
+@click.option('--intervalle', type=float, default=app.config['JOBS_POLL_INTERVAL'], show_default=True,
+              help="Secondes entre deux consultations de la file vide")
+@click.option('--une-fois', is_flag=True, help="S'arrête dès que la file est vide")
+def jobs_worker_command(intervalle, une_fois):
+    """Exécute les tâches de fond (PDF, exports) en attente et efface les fichiers des rapports supprimés ou orphelins"""
+    click.echo(f"Worker des tâches démarré (processus {os.getpid()})")
+    travailler(intervalle, une_fois)
+
+@app.cli.command('cloturer-soldes')
+@click.option('--reconstruire', is_flag=True, help="Supprime et recalcule tous les soldes de clôture")
+def cloturer_soldes_command(reconstruire):
+    """Enregistre les soldes de clôture des comptes pour les mois terminés"""
+    if reconstruire:
+        SoldeMensuel.query.delete()
+    nb_soldes = cloturer_soldes_mensuels()
+    db.session.commit()
+    click.echo(f"Soldes de clôture enregistrés: {nb_soldes}")
+
+@app.cli.command('rebuild-recherche')
+def rebuild_recherche_command():
+    """Recalcule le texte de recherche et reconstruit l'index des tables de ventes"""
+    nb_lignes = installer_index_recherche(reconstruire=True)
+    click.echo(f"Index de recherche reconstruit: {nb_lignes} ligne(s)")
+
 if __name__ == '__main__':
     init_db()  # Initialiser la base de données et l'utilisateur admin
     app.run(debug=True, host="0.0.0.0")
\ No newline at end of file
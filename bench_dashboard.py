@@ -0,0 +1,68 @@
+"""Benchmark des compteurs du tableau de bord (avant / après agrégation).
+
+Compare l'ancienne série de requêtes de dashboard() avec
+get_statistiques_dashboard() sur la base pointée par DATABASE_URL.
+
+Usage: python bench_dashboard.py [nombre_iterations]
+"""
+import sys
+import time as chrono
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+from app import (app, db, Personnel, Projet, Evenementiel, Trading, Academy, Digital,
+                 get_statistiques_dashboard)
+
+
+def statistiques_historiques(premier_jour_mois):
+    """Ancienne implémentation: une requête par compteur"""
+    stats = {
+        'total_personnel': Personnel.query.count(),
+        'personnel_actifs': Personnel.query.filter(Personnel.date_depart.is_(None)).count(),
+        'personnel_inactifs': Personnel.query.filter(Personnel.date_depart.isnot(None)).count(),
+        'projets_en_cours': Projet.query.filter(Projet.statut == 'en cours').count(),
+        'projets_termines': Projet.query.filter(Projet.statut == 'terminé').count(),
+        'projets_total': Projet.query.count(),
+        'evenements_en_cours': Evenementiel.query.filter(Evenementiel.statut == 'en cours').count(),
+        'evenements_total': Evenementiel.query.count(),
+    }
+    for modele in (Trading, Academy, Digital):
+        stats[f'revenus_{modele.__name__}'] = db.session.query(func.sum(modele.montant_ttc)).scalar() or 0
+        stats[f'revenus_mois_{modele.__name__}'] = db.session.query(func.sum(modele.montant_ttc)).filter(
+            modele.date_const >= premier_jour_mois
+        ).scalar() or 0
+    stats['dept_stats'] = db.session.query(
+        Personnel.departement, func.count(Personnel.id)
+    ).group_by(Personnel.departement).all()
+    stats['convention_stats'] = db.session.query(
+        Personnel.convention, func.count(Personnel.id)
+    ).group_by(Personnel.convention).all()
+    return stats
+
+
+def mesurer(nom, fonction, iterations):
+    requetes = []
+
+    def compter(conn, cursor, statement, parameters, context, executemany):
+        requetes.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', compter)
+    try:
+        premier_jour_mois = datetime.now().replace(day=1).date()
+        debut = chrono.perf_counter()
+        for _ in range(iterations):
+            fonction(premier_jour_mois)
+            db.session.rollback()
+        duree = (chrono.perf_counter() - debut) / iterations
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', compter)
+
+    print(f"{nom:<12} {len(requetes) / iterations:>6.1f} requête(s)   {duree * 1000:>8.2f} ms / appel")
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with app.app_context():
+        mesurer('avant', statistiques_historiques, iterations)
+        mesurer('après', get_statistiques_dashboard, iterations)
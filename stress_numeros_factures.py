@@ -0,0 +1,87 @@
+"""Test de charge de la numérotation des factures (allouer_numero_facture).
+
+Crée des factures depuis plusieurs threads, chacun avec sa propre session, sur la base
+pointée par DATABASE_URL, puis vérifie que les numéros sont distincts et sans trou et
+que la durée d'une création ne croît pas avec le nombre de factures.
+Les factures sont numérotées sur une journée fictive (1999-01-01); elles sont supprimées
+à la fin avec le compteur de cette journée.
+
+Sous SQLite, les créations sont sérialisées sur le verrou d'écriture de la base: en mode
+journal par défaut, chaque commit attend la synchronisation disque et, avec de nombreux
+threads, l'attente peut dépasser le délai de verrouillage (« database is locked »).
+Utiliser une base en mode WAL (PRAGMA journal_mode=WAL).
+
+Usage: python stress_numeros_factures.py [nombre_factures] [nombre_threads]
+"""
+import sys
+import threading
+import time as chrono
+from datetime import datetime
+
+from app import app, db, init_db, Facture, CompteurFacture, allouer_numero_facture
+
+JOUR_FICTIF = datetime(1999, 1, 1)
+DESIGNATION = 'stress numérotation'
+
+
+def creer_factures(nombre, durees, erreurs):
+    with app.app_context():
+        for _ in range(nombre):
+            debut = chrono.perf_counter()
+            try:
+                db.session.add(Facture(
+                    numero_facture=allouer_numero_facture(JOUR_FICTIF),
+                    nom_client='Client test',
+                    designation=DESIGNATION,
+                    date_facture=JOUR_FICTIF
+                ))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                erreurs.append(repr(e))
+                continue
+            durees.append(chrono.perf_counter() - debut)
+
+
+def nettoyer():
+    Facture.query.filter(Facture.designation == DESIGNATION).delete(synchronize_session=False)
+    CompteurFacture.query.filter(CompteurFacture.periode == JOUR_FICTIF.strftime('%Y%m%d')).delete()
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    nombre_factures = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    nombre_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    init_db()
+    with app.app_context():
+        nettoyer()
+
+    durees, erreurs = [], []
+    parts = [nombre_factures // nombre_threads + (i < nombre_factures % nombre_threads) for i in range(nombre_threads)]
+    threads = [threading.Thread(target=creer_factures, args=(part, durees, erreurs)) for part in parts]
+    debut = chrono.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duree_totale = chrono.perf_counter() - debut
+
+    with app.app_context():
+        numeros = [numero for (numero,) in db.session.query(Facture.numero_facture).filter(
+            Facture.designation == DESIGNATION
+        )]
+        rangs = sorted(int(numero.rsplit('-', 1)[1]) for numero in numeros)
+        nettoyer()
+
+    tranche = max(len(durees) // 10, 1)
+    print(f"{len(numeros)} facture(s) créée(s) par {nombre_threads} thread(s) en {duree_totale:.2f} s "
+          f"({len(numeros) / duree_totale:.0f} / s)")
+    print(f"durée moyenne d'une création: premiers 10 % {sum(durees[:tranche]) / tranche * 1000:.2f} ms, "
+          f"derniers 10 % {sum(durees[-tranche:]) / tranche * 1000:.2f} ms")
+    for erreur in erreurs[:5]:
+        print(f"erreur: {erreur}")
+
+    ok = not erreurs and len(set(numeros)) == len(numeros) == nombre_factures and rangs == list(range(1, nombre_factures + 1))
+    print("numéros distincts et consécutifs" if ok else f"ÉCHEC: {len(erreurs)} erreur(s), {len(numeros) - len(set(numeros))} doublon(s)")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,116 @@
+"""Vérification du nombre de requêtes SQL des pages de liste (verifier_budget_requetes).
+
+Crée une base SQLite temporaire, y insère plus d'une page de lignes pour chaque liste,
+puis affiche chaque page `*_list` en mode TESTING, avec et sans recherche: une page qui
+dépasse LIST_QUERY_BUDGET requêtes (chargement paresseux par ligne) fait échouer la vérification.
+La liste des rapports est aussi affichée pour un utilisateur non administrateur.
+
+Usage: python verifier_requetes_listes.py [lignes_par_liste]
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+dossier = tempfile.mkdtemp(prefix='kunda-listes-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(dossier, 'listes.db')
+
+from flask import g
+
+from app import (app, db, init_db, Personnel, Journal, Trading, Academy, Digital, Materiel, Finance,
+                 Projet, Evenementiel, Rapport, ProcesVerbal, PVParticipant, Facture)
+
+
+def remplir(nombre):
+    """Insère `nombre` lignes par liste; retourne l'identifiant du premier personnel"""
+    jour = date(2025, 1, 1)
+    personnels = []
+    for i in range(nombre):
+        personnel = Personnel(nom=f'Nom{i}', prenom='Prenom', username=f'liste{i}', email=f'liste{i}@exemple.com',
+                              departement='Trading', role='Trading', password='x')
+        db.session.add(personnel)
+        db.session.flush()
+        personnels.append(personnel.id)
+        # Un auteur différent par ligne: une relation chargée paresseusement coûte une requête par ligne
+        auteur = personnel.id
+        db.session.add(Journal(action='VERIFICATION', description=f'Entrée {i}', personnel_id=auteur))
+        for modele in (Trading, Academy, Digital):
+            db.session.add(modele(date_const=jour + timedelta(days=i), nom_client=f'Nom{i}', quantite=1,
+                                  prix_unit=100, montant_ht=100, tva=18, montant_ttc=118, personnel_id=auteur))
+        db.session.add(Materiel(nom_produit=f'Matériel {i}', date_sortie=jour + timedelta(days=i), quantite=1))
+        db.session.add(Finance(date=jour + timedelta(days=i), libelle=f'Écriture {i}', numero_compte='512', credit=10))
+        db.session.add(Projet(nom=f'Projet {i}', description='Description', date_debut=jour, departement='Trading'))
+        db.session.add(Evenementiel(nom=f'Événement {i}', description='Description', date_debut=jour,
+                                     departement='Trading'))
+        # Un rapport de l'auteur et un du premier personnel (liste vue sans être administrateur)
+        for proprietaire in (auteur, personnels[0]):
+            db.session.add(Rapport(titre=f'Rapport {i}', nom_fichier='rapport.pdf', chemin_fichier='rapport.pdf',
+                                   type_fichier='pdf', taille_fichier=1, semaine_debut=jour,
+                                   semaine_fin=jour + timedelta(days=6), personnel_id=proprietaire))
+        pv = ProcesVerbal(titre=f'PV {i}', date_reunion=jour + timedelta(days=i), heure_debut=time(9),
+                          ordre_du_jour='Ordre du jour', created_by=auteur)
+        db.session.add(pv)
+        db.session.flush()
+        db.session.add(PVParticipant(proces_verbal_id=pv.id, personnel_id=personnels[0]))
+        db.session.add(Facture(numero_facture=f'VERIF-{i:04d}', nom_client=f'Client {i}', designation='Prestation',
+                               date_facture=datetime(2025, 1, 1) + timedelta(days=i)))
+    db.session.commit()
+    return personnels[0]
+
+
+def afficher(client, utilisateur, endpoint, recherche):
+    """Affiche une page de liste; retourne (statut HTTP ou erreur, nombre de requêtes SQL)"""
+    with client.session_transaction() as s:
+        s.update(utilisateur)
+    with app.test_request_context():
+        url = app.url_for(endpoint, search=recherche or None)
+    comptes = []
+
+    def noter(reponse):
+        comptes.append(g.get('nb_requetes_sql'))
+        return reponse
+
+    # Exécuté après verifier_budget_requetes (les fonctions after_request sont appelées en ordre inverse)
+    app.after_request_funcs[None].insert(0, noter)
+    try:
+        return client.get(url).status_code, comptes[0] if comptes else None
+    except AssertionError as e:
+        return str(e), None
+    finally:
+        app.after_request_funcs[None].remove(noter)
+
+
+if __name__ == '__main__':
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+
+    app.config['TESTING'] = True
+    init_db()
+    with app.app_context():
+        # L'administrateur créé par init_db a une date de départ: son accès est révoqué
+        admin = Personnel(nom='Verification', prenom='Admin', username='verification-admin',
+                          email='verification-admin@exemple.com', departement='Direction',
+                          role='Administrator', password='x')
+        db.session.add(admin)
+        utilisateur = db.session.get(Personnel, remplir(nombre))
+        administrateur = {'id': admin.id, 'role': admin.role, 'username': admin.username,
+                          'nom': admin.nom, 'prenom': admin.prenom}
+        employe = {'id': utilisateur.id, 'role': utilisateur.role, 'username': utilisateur.username,
+                   'nom': utilisateur.nom, 'prenom': utilisateur.prenom}
+
+    pages = [(administrateur, endpoint) for endpoint in sorted(app.view_functions) if endpoint.endswith('_list')]
+    pages.append((employe, 'rapport_list'))
+
+    budget = app.config['LIST_QUERY_BUDGET']
+    client = app.test_client()
+    echecs = 0
+    for utilisateur, endpoint in pages:
+        for recherche in ('', 'Nom1'):
+            statut, nb_requetes = afficher(client, utilisateur, endpoint, recherche)
+            ok = statut == 200
+            echecs += not ok
+            print(f"[{'OK' if ok else 'ÉCHEC'}] {endpoint} ({utilisateur['role']}"
+                  f"{', recherche' if recherche else ''}): {nb_requetes if ok else statut} requête(s)")
+
+    print(f"{len(pages) * 2 - echecs} page(s) dans la limite de {budget} requêtes, {echecs} échec(s) "
+          f"({nombre} lignes par liste, base {dossier})")
+    sys.exit(1 if echecs else 0)